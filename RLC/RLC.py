@@ -3,7 +3,9 @@
 
 import os
 import time
+import threading
 import numpy as np
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 
 import qcodes as qc
 from qcodes import Instrument
@@ -12,6 +14,72 @@ from qcodes.utils.validators import ComplexNumbers
 
 from typing import Optional
 
+
+def calc_builtin_imps(ws, L, C):
+    '''
+    Vectorized version of BuiltinImp.get_raw(). Calculates the built-in impedance for a whole array
+    of frequencies ws in one go and returns a complex array of the same shape.
+    '''
+    ws = np.asarray(ws, dtype=float)
+    ws = np.where(ws == 0, 1E-12, ws)  # Same zero frequency handling as BuiltinImp.get_raw().
+
+    with np.errstate(divide='ignore', invalid='ignore'):  # Exactly on resonance the impedance blows up, just like the scalar version.
+        return 1.0 / ((1.0 / (1.0j*ws*L)) + 1.0j*ws*C)
+
+
+def calc_total_imps(Z_0, Z_e):
+    '''
+    Vectorized version of TotalImp.get_raw(). Z_0 is an array of built-in impedances.
+    '''
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return (Z_0 * Z_e) / (Z_0 + Z_e)
+
+
+def calc_ref_coeffs(Z_circ, Z_in):
+    '''
+    Vectorized version of ReflectionCoeff.get_raw(). Z_circ is an array of total circuit impedances.
+    '''
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return (Z_circ - Z_in) / (Z_circ + Z_in)
+
+
+def calc_sweep(freqs, L, C, ext_imp, input_imp):
+    '''
+    Calculates the built-in impedance, total impedance and reflection coefficient over freqs from plain
+    circuit values. This is what Circuit.sweep() uses, but it doesn't need an instrument so it can be
+    sent to worker processes (instruments can't be pickled).
+    '''
+    Z_0 = calc_builtin_imps(freqs, L, C)
+    Z_circ = calc_total_imps(Z_0, ext_imp)
+    gammas = calc_ref_coeffs(Z_circ, input_imp)
+
+    return {'builtin_imp': Z_0, 'total_imp': Z_circ, 'ref_coeff': gammas}
+
+
+def _calc_sweep_job(job):  # ProcessPoolExecutor.map() wants a single picklable, module-level callable.
+    freqs, values = job
+    return calc_sweep(freqs, **values)
+
+
+def sweep_circuits(circuits, freqs, max_workers=None, processes=False):
+    '''
+    Sweeps several Circuit instruments over the same frequency array in parallel and returns a list of
+    Circuit.sweep() results in the same order as circuits.
+
+    By default this uses a thread pool. Every Circuit keeps its own frequency state and lock, so any
+    number of them can be evaluated at once; NumPy releases the GIL for the heavy lifting. With
+    processes=True the circuit values are read once in this process and the sweeps run in a process
+    pool instead, which is the way to go for big banks of circuits or very long sweeps.
+    '''
+    if processes:
+        jobs = [(freqs, circ.circuit_values()) for circ in circuits]  # By keyword, so the order of circuit_values() doesn't matter.
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            return list(executor.map(_calc_sweep_job, jobs))
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(lambda circ: circ.sweep(freqs), circuits))
+
+
 class BuiltinImp(Parameter):
     '''
     Parameter calculates the built-in impedance of the circuit (without the black box) in its get_raw() method.
@@ -23,21 +91,20 @@ class BuiltinImp(Parameter):
         self.set_supply_freq(self.root_instrument.supply_freq())
 
     def set_supply_freq(self, supply_freq):  # These shenanigans are so that I can just call this function again later during the ZeroDivisionError handling in get_raw().
-        global w                             # w for \omega
-        w = supply_freq
+        self.w = supply_freq                 # w for \omega. Kept per parameter (i.e. per circuit), not as a module global, so circuits don't trample each other.
 
     def get_raw(self, **kwargs):
-        L = self.root_instrument.builtin_ind()
-        C = self.root_instrument.builtin_cap()
-        self.set_supply_freq(self.root_instrument.supply_freq())
+        with self.root_instrument.lock:      # Don't let another thread change the circuit halfway through.
+            L = self.root_instrument.builtin_ind()
+            C = self.root_instrument.builtin_cap()
+            self.set_supply_freq(self.root_instrument.supply_freq())
 
-        global w
-        try:
-            return ((1.0 /  complex(0, w*L)) + complex(0, w*C))**-1
-        except ZeroDivisionError:
-            self.root_instrument.log.info("Frequency was zero, but this results in division by zero. It will be reset to 1E-12.")
-            w = 1E-12
-            return ((1.0 /  complex(0, w*L)) + complex(0, w*C))**-1
+            try:
+                return ((1.0 /  complex(0, self.w*L)) + complex(0, self.w*C))**-1
+            except ZeroDivisionError:
+                self.root_instrument.log.info("Frequency was zero, but this results in division by zero. It will be reset to 1E-12.")
+                self.set_supply_freq(1E-12)
+                return ((1.0 /  complex(0, self.w*L)) + complex(0, self.w*C))**-1
 
 
 class TotalImp(Parameter):
@@ -93,6 +160,7 @@ class Circuit(Instrument):
 
     def __init__(self, name, ext_imp=complex(200.0, 100.0), potential=1E-2, input_imp=100.0, builtin_ind=46.1E-9, builtin_cap=2.61E-12, **kwargs):
         super().__init__(name, **kwargs)
+        self.lock = threading.RLock()  # Guards the supply_freq -> builtin_imp/ref_coeff chain when one circuit is shared between threads.
 
         self.add_parameter('potential',  # Max amplitude of potential waveform at frequency (below)
                            unit='Volt',
@@ -201,11 +269,41 @@ class Circuit(Instrument):
         self.log.info(f"Connected to instrument: {idn}")
 
     def set_values(self, Z, V, Z_in, L, C):
-        self.ext_imp(Z)
-        self.potential(V)
-        self.input_imp(Z_in)
-        self.builtin_ind(L)
-        self.builtin_cap(C)
-        self.builtin_ind()      #This is important, it sets the value for builtin_ind so that it's not None when the experiment is run.
+        with self.lock:
+            self.ext_imp(Z)
+            self.potential(V)
+            self.input_imp(Z_in)
+            self.builtin_ind(L)
+            self.builtin_cap(C)
+            self.builtin_ind()      #This is important, it sets the value for builtin_ind so that it's not None when the experiment is run.
+
+    def circuit_values(self):
+        '''
+        Returns the values calc_sweep() needs (L, C, ext_imp, input_imp), read together under the lock.
+        '''
+        with self.lock:
+            return {'L': self.builtin_ind(),
+                    'C': self.builtin_cap(),
+                    'ext_imp': self.ext_imp(),
+                    'input_imp': self.input_imp()}
+
+    def at_freq(self, freq):
+        '''
+        Sets supply_freq and reads the reflection coefficient in one go, without another thread
+        being able to change supply_freq in between. Returns ref_coeff at freq.
+        '''
+        with self.lock:
+            self.supply_freq(freq)
+            return self.ref_coeff()
+
+    def sweep(self, freqs):
+        '''
+        Calculates builtin_imp, total_imp and ref_coeff for every frequency in freqs in a single NumPy pass.
+
+        Unlike setting supply_freq and calling the parameters point by point, this doesn't go through
+        the QCoDeS get/set machinery for each frequency, and supply_freq is left untouched.
+        Returns a dictionary of complex arrays keyed by parameter name.
+        '''
+        return calc_sweep(freqs, **self.circuit_values())
 
 #  LocalWords:  inductor
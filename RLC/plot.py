@@ -34,36 +34,91 @@ def gen_freqs(circ, ctr=None, rng=1E-3):  # Frequy spelling...
 
 
 def gen_imps(circ, freqs):                   # No, impedances not monkeys.
-    imps = np.zeros_like(freqs)
-
-    for ind, freq in enumerate(freqs):
-        circ.supply_freq(freq)
-        imps[ind] = np.absolute(circ.builtin_imp())  # Note the absolute value.
+    imps = np.absolute(circ.sweep(freqs)['builtin_imp'])  # Note the absolute value.
 
     return imps
 
 
 def gen_refs(circ, freqs):                   # refs, i.e reflection coefficients.
-    refs = np.zeros_like(freqs)
-
-    for ind, freq in enumerate(freqs):
-        circ.supply_freq(freq)
-        refs[ind] = np.absolute(circ.ref_coeff())  # Note the absolute value.
+    refs = np.absolute(circ.sweep(freqs)['ref_coeff'])  # Note the absolute value.
 
     return refs
 
-def find_refs_ctr(circ, freqs, refs):  # This method is necessary to find the center of the reflection coefficient graph.
-    center = 0.0
-    end_ref = refs[-1]
-    rng = 0.0
-
-    if end_ref > .9999999999:
-        center = freqs[int(len(refs)-1)]
-        rng = freqs[int(len(refs)-1)]
-    else:
-        new_freqs = gen_freqs(circ, ctr=freqs[-1], rng=freqs[-1])
-        new_refs = gen_refs(circ, new_freqs)
-        center = find_refs_ctr(circ, new_freqs, new_refs)[0]
+def find_refs_ctr(circ, recovery=0.99, decades=3, n_scan=60, xtol=1E-12, rtol=1E-3, max_evals=400):  # This method is necessary to find the center of the reflection coefficient graph.
+    '''
+    Locates the dip in |Gamma| and returns (center, rng) of the window it sits in, i.e. gen_freqs(circ, center, rng)
+    covers the feature.
+
+    The model puts the dip at (or near) res_freq, so |Gamma| is first scanned at res_freq and at n_scan log-spaced
+    offsets on either side of it, from 1E-9 up to +-decades (in log10 of the frequency). That catches narrow high-Q
+    dips as well as broad ones. The bottom is then refined with a golden-section search between the scan points
+    around the lowest one, and each edge (where |Gamma| has come back up recovery of the way from the bottom to 1)
+    is found by bisection, to rtol of its distance from the bottom. Every |Gamma| evaluation is memoized and there
+    are never more than max_evals of them. The window is centered on the bottom of the dip and wide enough for
+    both edges (but never reaches below 0 Hz.) If there is no dip (e.g. a purely reactive black box) the window
+    defaults to res_freq +- res_freq.
+    '''
+    values = circ.circuit_values()
+    res = circ.res_freq()
+    x_res = np.log10(res)
+    refs = {}  # |Gamma| memoized by log10(frequency).
+
+    def ref_at(x):
+        if x not in refs:
+            ref = float(np.absolute(RLC.calc_sweep(10.0**x, **values)['ref_coeff']))
+            if not(np.isfinite(ref)):  # Right on the resonance the impedance blows up, take the value next to it.
+                ref = float(np.absolute(RLC.calc_sweep(10.0**x * (1 + 1E-12), **values)['ref_coeff']))
+            refs[x] = ref
+        return refs[x]
+
+    def budget_left():
+        return len(refs) < max_evals
+
+    # Coarse scan, dense close to res_freq.
+    offsets = np.logspace(-9, np.log10(decades), n_scan)
+    xs = np.concatenate((x_res - offsets[::-1], [x_res], x_res + offsets))
+    scan = np.array([ref_at(x) for x in xs])
+    min_ind = int(np.argmin(scan))
+
+    # Golden-section search for the bottom of the dip, between the neighbours of the lowest scan point.
+    inv_phi = (np.sqrt(5.0) - 1.0) / 2.0
+    a, b = xs[max(min_ind - 1, 0)], xs[min(min_ind + 1, len(xs) - 1)]
+    x1, x2 = b - inv_phi*(b - a), a + inv_phi*(b - a)
+
+    while b - a > xtol and budget_left():
+        if ref_at(x1) < ref_at(x2):
+            b, x2 = x2, x1
+            x1 = b - inv_phi*(b - a)
+        else:
+            a, x1 = x1, x2
+            x2 = a + inv_phi*(b - a)
+
+    x_min = min((xs[min_ind], (a + b) / 2.0), key=ref_at)
+    ref_min = ref_at(x_min)
+
+    if not(1.0 - ref_min > 1E-12):  # Nothing to see here.
+        return (res, res)
+
+    level = ref_min + recovery*(1.0 - ref_min)
+
+    def find_edge(inside, outside):  # Bisects between a point inside the dip and one outside it.
+        if ref_at(outside) < level:  # The dip is wider than the search bracket, so stop at the bracket.
+            return outside
+
+        while abs(outside - inside) > max(rtol*abs(inside - x_min), xtol) and budget_left():
+            mid = (inside + outside) / 2.0
+            if ref_at(mid) < level:
+                inside = mid
+            else:
+                outside = mid
+
+        return outside
+
+    lower = 10.0**find_edge(x_min, x_res - decades)
+    upper = 10.0**find_edge(x_min, x_res + decades)
+
+    center = 10.0**x_min
+    rng = min(max(center - lower, upper - center), center)
 
     return (center, rng)
 
@@ -93,8 +148,7 @@ def plot1(circ):
     x1 = gen_freqs(circ)
     y1 = gen_imps(circ, x1)
 
-    refs_ctr = find_refs_ctr(circ, x1, y1)[0]
-    refs_rng = find_refs_ctr(circ, x1, y1)[1]
+    refs_ctr, refs_rng = find_refs_ctr(circ)
     x2 = gen_freqs(circ, refs_ctr, refs_rng)
     y2 = gen_refs(circ, x2)
 
@@ -0,0 +1,157 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+from abc import ABC, abstractmethod
+
+import numpy as np
+
+from ResSensitivity import calc_s11_batch
+from MWO import SchematicClient, connect_mwo
+
+'''
+------------------
+SIMULATOR BACKENDS
+------------------
+The four things the sweep/optimization code needs from a circuit
+simulator, behind one interface:
+
+    backend.set_frequencies(freqs)
+    backend.set_element_values('Inductor_Subcircuit', CAP=1e-14, IND=2e-8)
+    backend.analyze()
+    freqs, s11s = backend.fetch_trace('Parallel')
+
+AnalyticBackend does this at NumPy speed with the ResSensitivity model
+(on Linux, in tests, in optimizers), MWOBackend drives AWR Microwave
+Office through pyawr for the final verification.
+---------------------------------------
+'''
+
+
+class SimulatorBackend(ABC):
+    '''
+    Interface for circuit simulator backends. Like in MWO, traces only
+    change when analyze() is called, not when values are set. A backend
+    missing any of these methods can't be instantiated.
+    '''
+
+    @abstractmethod
+    def set_frequencies(self, freqs):
+        # Replaces the project's frequencies (Hz).
+        raise NotImplementedError
+
+    @abstractmethod
+    def set_element_values(self, schematic, **values):
+        # Sets element values by component name, e.g. CAP=1e-14.
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_element_values(self, schematic):
+        # Returns a dictionary of component name -> value.
+        raise NotImplementedError
+
+    @abstractmethod
+    def analyze(self):
+        raise NotImplementedError
+
+    @abstractmethod
+    def fetch_trace(self, graph_name):
+        # Returns (frequencies, values) of the first measurement on the graph.
+        raise NotImplementedError
+
+
+class AnalyticBackend(SimulatorBackend):
+    '''
+    Native stand-in for MWO built on the ResSensitivity circuit model.
+
+    Schematics hold CAP/IND/RES values and graphs show |S11| of a schematic
+    as either the series or the parallel circuit, just like the
+    'Parallel' and 'Series' graphs of our MWO project, which both use
+    'Inductor_Subcircuit'. analyze() evaluates all graphs in one
+    vectorized calc_s11_batch() call. The model is lossless, so RES is
+    stored but doesn't affect the traces.
+    '''
+
+    DEFAULT_SCHEMATICS = {'Inductor_Subcircuit': {'CAP': 24.925e-15, 'IND': 20e-9, 'RES': 1e9}}
+    DEFAULT_GRAPHS = {'Parallel': ('Inductor_Subcircuit', False),   #graph name: (schematic, is_series)
+                      'Series': ('Inductor_Subcircuit', True)}
+
+    def __init__(self, schematics=None, graphs=None, z_in=50, freqs=None):
+        schematics = self.DEFAULT_SCHEMATICS if schematics is None else schematics
+        self.schematics = {name: dict(values) for name, values in schematics.items()}
+        self.graphs = dict(self.DEFAULT_GRAPHS if graphs is None else graphs)
+        self.z_in = z_in
+        self.freqs = np.linspace(4e9, 8e9, 10000) if freqs is None else np.asarray(freqs, dtype=float)
+        self.traces = {}
+        self.n_analyses = 0
+
+    def set_frequencies(self, freqs):
+        self.freqs = np.asarray(freqs, dtype=float)
+
+    def set_element_values(self, schematic, **values):
+        unknown = set(values) - set(self.schematics[schematic])
+        if unknown:
+            raise KeyError("Schematic {} has no element(s) {}.".format(schematic, sorted(unknown)))
+
+        self.schematics[schematic].update(values)
+
+    def get_element_values(self, schematic):
+        return dict(self.schematics[schematic])
+
+    def analyze(self):
+        names = list(self.graphs)
+        Ls = [self.schematics[self.graphs[name][0]]['IND'] for name in names]
+        Cs = [self.schematics[self.graphs[name][0]]['CAP'] for name in names]
+        series = [self.graphs[name][1] for name in names]
+
+        s11s = np.abs(calc_s11_batch(Ls, Cs, self.z_in, self.freqs, series))
+        self.traces = {name: (self.freqs, s11s[ind]) for ind, name in enumerate(names)}
+        self.n_analyses += 1
+
+    def fetch_trace(self, graph_name):
+        return self.traces[graph_name]
+
+
+class MWOBackend(SimulatorBackend):
+    '''
+    Backend for AWR Microwave Office through its COM API (Windows only).
+    Element values go through an MWO.SchematicClient, so only changed
+    values are written and analyze() only runs Simulator.Analyze() when
+    something changed since the last analysis.
+    '''
+
+    def __init__(self, awrde=None, elements=None):
+        self.awrde = connect_mwo() if awrde is None else awrde
+        self.client = SchematicClient(self.awrde)
+        self.elements = elements    #None is MWO.ELEMENTS
+
+    def get_client_handles(self, schematic):
+        if schematic not in self.client.handles:
+            self.client.bind_schematic(schematic, self.elements)
+
+        return self.client.handles[schematic]
+
+    def set_frequencies(self, freqs):
+        self.awrde.Project.Frequencies.Clear()
+        self.awrde.Project.Frequencies.AddMultiple(np.asarray(freqs, dtype=float))
+        self.client.invalidate()
+
+    def set_element_values(self, schematic, **values):
+        self.get_client_handles(schematic)
+        self.client.set_params(schematic, analyze=False, **values)
+
+    def get_element_values(self, schematic):
+        self.get_client_handles(schematic)
+        return self.client.get_params(schematic)
+
+    def analyze(self):
+        self.client.analyze()
+
+    def fetch_trace(self, graph_name):
+        meas = self.awrde.Project.Graphs(graph_name).Measurements[0]
+        return (np.asarray(meas.XValues), np.asarray(meas.YValues(1)))
+
+
+def get_backend(name='analytic', **kwargs):
+    # 'analytic' or 'mwo', kwargs go to the backend's constructor.
+    backends = {'analytic': AnalyticBackend, 'mwo': MWOBackend}
+    return backends[name](**kwargs)
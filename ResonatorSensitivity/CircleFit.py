@@ -0,0 +1,160 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+import numpy as np
+
+'''
+-----------
+CIRCLE FIT
+-----------
+Algebraic resonator fit for a whole stack of complex S-parameter traces
+at once (no qkit, no temporary graphs, no iterative optimizer), for the
+same model qkit's circle fit uses (see analyze_circuit in circle_fit.ipynb):
+
+    S(f) = a e^(i(alpha - 2 pi f delay)) (1 - 2 Ql / (n_ports Qc_cpx (1 + 2i Ql (f/fr - 1))))
+
+with Qc_cpx = |Qc| e^(-i phi), n_ports = 1 for reflection, 2 for notch
+(hanger) resonators. Without the delay that's a rational function
+S = (a0 + a1 x) / (1 + c x) of the (normalized) frequency x, so
+S (1 + c x) = a0 + a1 x is solved as a linear least-squares problem for
+every trace, and everything else follows from it:
+
+    fits = fit_traces(freqs, s21s, port_type='notch_port')
+    good_frs = fits["fr"][fits["fit_good"]]
+---------------------------------------
+'''
+
+PORT_TYPES = {'reflection_port': 1, 'notch_port': 2}
+
+
+def calc_model(freqs, fr, Ql, absQc, phi=0., a=1., alpha=0., delay=0., n_ports=1):
+    # The resonator model above (broadcasts over all arguments.)
+    freqs = np.asarray(freqs, dtype=float)
+    Qc_cpx = absQc * np.exp(-1j*phi)
+
+    return a * np.exp(1j*(alpha - 2*np.pi*freqs*delay)) * (1. - 2.*Ql / (n_ports * Qc_cpx * (1. + 2j*Ql*(freqs/fr - 1.))))
+
+
+def estimate_delay(freqs, s_params, edge_fraction=0.1):
+    '''
+    Guesses the electrical delay of each trace from the slope of its
+    unwrapped phase over the first and last edge_fraction of the points
+    (away from the resonance.)
+    '''
+    n_edge = max(2, int(edge_fraction * freqs.shape[-1]))
+    phases = np.unwrap(np.angle(s_params), axis=-1)
+    fs = np.broadcast_to(freqs, phases.shape)
+
+    edge_fs = np.concatenate((fs[..., :n_edge], fs[..., -n_edge:]), axis=-1)
+    edge_phases = np.concatenate((phases[..., :n_edge], phases[..., -n_edge:]), axis=-1)
+    fs_c = edge_fs - edge_fs.mean(axis=-1, keepdims=True)
+    slopes = (fs_c * (edge_phases - edge_phases.mean(axis=-1, keepdims=True))).sum(axis=-1) / (fs_c**2).sum(axis=-1)
+
+    return -slopes / (2*np.pi)
+
+
+def fit_circle(s_params):
+    '''
+    Kasa (algebraic) circle fit in the complex plane for every trace.
+    Returns (centers, radii).
+    '''
+    xs, ys = s_params.real, s_params.imag
+    design = np.stack((xs, ys, np.ones_like(xs)), axis=-1)
+    rhs = xs**2 + ys**2
+
+    q, r = np.linalg.qr(design)
+    sol = np.linalg.solve(r, (q.transpose(0, 2, 1) @ rhs[..., None]))[..., 0]
+
+    centers = sol[:, 0]/2 + 1j*sol[:, 1]/2
+    radii = np.sqrt(np.maximum(sol[:, 2] + np.abs(centers)**2, 0))
+
+    return centers, radii
+
+
+def fit_rational(xs, s_params, n_iter=3):
+    '''
+    Least-squares (a0, a1, c) of s (1 + c x) = a0 + a1 x for every trace,
+    reweighted n_iter times by 1/|1 + c x| so the result minimizes the
+    actual residual of s, not the linearized one. xs is (n_traces,
+    n_points), s_params the same shape. Returns (a0s, a1s, cs).
+    '''
+    weights = np.ones(xs.shape)
+
+    for _ in range(n_iter):
+        design = np.stack((np.ones_like(xs), xs, -xs*s_params), axis=-1) * weights[..., None]
+        q, r = np.linalg.qr(design)
+        sol = np.linalg.solve(r, (q.conj().transpose(0, 2, 1) @ (s_params*weights)[..., None]))[..., 0]
+        a0s, a1s, cs = sol[:, 0], sol[:, 1], sol[:, 2]
+        weights = 1 / np.maximum(np.abs(1 + cs[:, None]*xs), 1e-12)
+
+    return a0s, a1s, cs
+
+
+def fit_traces(freqs, s_params, port_type='reflection_port', delay=0., n_iter=3):
+    '''
+    Fits every trace of s_params ((n_traces, n_points), or a single trace)
+    measured at freqs ((n_points,) or the same shape as s_params.)
+    port_type is 'reflection_port' or 'notch_port'. delay is the
+    electrical delay to take out first: a number, one per trace, or
+    'auto' to estimate it with estimate_delay().
+
+    Returns a dictionary of arrays with one value per trace (scalars for
+    a single trace): fr, Ql, Qc, absQc, phi, Qi, a, alpha, delay, the
+    fitted circle's center and radius, the rms residual of the fit and
+    fit_good (the is_fit_good() checks from the notebook: finite, all Qs
+    positive and fr inside freqs.)
+    '''
+    n_ports = PORT_TYPES[port_type]
+    single = np.ndim(s_params) == 1
+    s_params = np.atleast_2d(np.asarray(s_params, dtype=complex))
+    freqs = np.broadcast_to(np.asarray(freqs, dtype=float), s_params.shape)
+
+    delays = estimate_delay(freqs, s_params) if isinstance(delay, str) else np.broadcast_to(np.asarray(delay, dtype=float), s_params.shape[:1])
+    s_params = s_params * np.exp(2j*np.pi*freqs*delays[:, None])
+
+    # Normalized frequency, for conditioning.
+    f_mids = (freqs[:, 0] + freqs[:, -1]) / 2
+    f_spans = np.where(freqs[:, -1] != freqs[:, 0], (freqs[:, -1] - freqs[:, 0]) / 2, 1.0)
+    xs = (freqs - f_mids[:, None]) / f_spans[:, None]
+
+    a0s, a1s, cs = fit_rational(xs, s_params, n_iter)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        f_poles = f_mids - f_spans / cs             #Where 1 + c x = 0, i.e. fr (1 + i / 2Ql).
+        frs = f_poles.real
+        Qls = frs / (2*f_poles.imag)
+
+        a_envs = a1s / cs                           #Far off resonance.
+        x_rs = (frs - f_mids) / f_spans
+        ks = 1 - (a0s + a1s*x_rs) / (1 + cs*x_rs) / a_envs
+        Qc_cpxs = 2*Qls / (n_ports*ks)
+
+        Qcs = 1 / np.real(1/Qc_cpxs)
+        Qis = 1 / (1/Qls - 1/Qcs)
+
+        residuals = np.sqrt(np.mean(np.abs((a0s[:, None] + a1s[:, None]*xs) / (1 + cs[:, None]*xs) - s_params)**2, axis=1))
+
+    centers, radii = fit_circle(s_params)
+
+    fit_good = (np.isfinite(frs) & np.isfinite(Qls) & np.isfinite(Qcs) & np.isfinite(Qis)
+                & (Qls > 0) & (Qcs > 0) & (Qis > 0)
+                & (freqs[:, 0] < frs) & (frs < freqs[:, -1]))
+
+    fits = {"fr": frs,
+            "Ql": Qls,
+            "Qc": Qcs,
+            "absQc": np.abs(Qc_cpxs),
+            "phi": -np.angle(Qc_cpxs),
+            "Qi": Qis,
+            "a": np.abs(a_envs),
+            "alpha": np.angle(a_envs),
+            "delay": np.array(delays),
+            "center": centers,
+            "radius": radii,
+            "residual": residuals,
+            "fit_good": fit_good}
+
+    if single:
+        fits = {key: value[0] for key, value in fits.items()}
+
+    return fits
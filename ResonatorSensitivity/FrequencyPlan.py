@@ -0,0 +1,108 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+import numpy as np
+
+'''
+---------------
+FREQUENCY PLANS
+---------------
+reset_freqs() from the notebooks, but remembering what's already set:
+resetting to the same grid doesn't clear and re-add the frequencies, it
+only analyzes. On top of that, find_resonance() zooms in coarse-to-fine,
+with grids that are only dense around the resonance, so each analysis is
+a few hundred points instead of 10k evenly spaced ones:
+
+    plan = FrequencyPlan(get_backend('mwo'))
+    f_res, freqs, s11s = plan.find_resonance('Parallel')
+---------------------------------------
+'''
+
+
+def uniform_grid(l_bnd=4e9, u_bnd=8e9, steps=10000):
+    return np.linspace(l_bnd, u_bnd, steps)
+
+
+def refined_grid(l_bnd, u_bnd, center, width, coarse_steps=201, fine_steps=401):
+    '''
+    coarse_steps points over [l_bnd, u_bnd] plus fine_steps points over
+    [center - width, center + width] (clipped to the band), sorted.
+    '''
+    fine_l_bnd = max(l_bnd, center - width)
+    fine_u_bnd = min(u_bnd, center + width)
+
+    return np.unique(np.concatenate((np.linspace(l_bnd, u_bnd, coarse_steps),
+                                     np.linspace(fine_l_bnd, fine_u_bnd, fine_steps))))
+
+
+def steepest_point(xs, ys):
+    # Frequency of the largest |dy/dx| (np.gradient handles the uneven grids.)
+    return float(xs[np.argmax(np.abs(np.gradient(ys, xs)))])
+
+
+class FrequencyPlan():
+    '''
+    Keeps track of the frequencies set on a Backends.SimulatorBackend, so
+    it's only told about actual changes.
+    '''
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.freqs = None       #The last grid applied.
+        self.n_resets = 0       #How many times the simulator's frequencies were actually replaced.
+        self.n_analyses = 0
+
+    def apply(self, freqs, analyze=True):
+        '''
+        Sets freqs on the backend unless it's the grid that's already set,
+        then analyzes either way (like reset_freqs() always did), so element
+        changes made since the last analysis are picked up. Backends that
+        track changes (MWOBackend) skip the analysis themselves if nothing
+        changed. Returns whether the grid changed.
+        '''
+        freqs = np.asarray(freqs, dtype=float)
+        changed = self.freqs is None or not(np.array_equal(freqs, self.freqs))
+
+        if changed:
+            self.backend.set_frequencies(freqs)
+            self.freqs = freqs.copy()
+            self.freqs.setflags(write=False)
+            self.n_resets += 1
+
+        if analyze:
+            self.backend.analyze()
+            self.n_analyses += 1
+
+        return changed
+
+    def reset_freqs(self, l_bnd=4e9, u_bnd=8e9, steps=10000):
+        '''
+        Same as reset_freqs() in the notebooks: an evenly spaced grid from
+        l_bnd to u_bnd in steps steps, set (only if it isn't set already)
+        and analyzed. Returns the grid.
+        '''
+        self.apply(uniform_grid(l_bnd, u_bnd, steps))
+        return self.freqs
+
+    def find_resonance(self, graph_name='Parallel', l_bnd=4e9, u_bnd=8e9, coarse_steps=201, fine_steps=401,
+                       n_levels=3, zoom=10, locate=steepest_point):
+        '''
+        Coarse-to-fine search for the resonance of graph_name: a coarse
+        grid over the band first, then n_levels grids each with a fine
+        region zoom times narrower than the last, centered on where
+        locate(freqs, values) (the steepest point by default) put the
+        resonance. Returns (resonance frequency, freqs, values) of the
+        finest grid.
+        '''
+        self.apply(uniform_grid(l_bnd, u_bnd, coarse_steps))
+        xs, ys = self.backend.fetch_trace(graph_name)
+        center = locate(np.asarray(xs), np.asarray(ys))
+        width = (u_bnd - l_bnd) / 2
+
+        for _ in range(n_levels):
+            width /= zoom
+            self.apply(refined_grid(l_bnd, u_bnd, center, width, coarse_steps, fine_steps))
+            xs, ys = self.backend.fetch_trace(graph_name)
+            center = locate(np.asarray(xs), np.asarray(ys))
+
+        return center, np.asarray(xs), np.asarray(ys)
@@ -5,7 +5,10 @@ import os
 import time
 import numpy as np
 import matplotlib.pyplot as plt
-from ResSensitivity import * as res
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor
+from scipy.optimize import minimize_scalar
+from ResSensitivity import *
 
 # L_l_bnd = 1e-9               #Inductance lower bound
 # L_u_bnd = 100e-9             #Inductance upper bound
@@ -27,8 +30,8 @@ def plot_der():
     plt.show()
 
 #TODO: fix these
-def set_C(C_builtin = 1, C_cpl = 1, C_imp = 1):
-    C_total = ###
+# def set_C(C_builtin = 1, C_cpl = 1, C_imp = 1):
+#     C_total = ###
 
 #FIXME: Duplicated as class variables:
 # w_l_bnd = None                  #Frequency sweep lower bound (Hz)
@@ -58,3 +61,46 @@ def set_C(C_builtin = 1, C_cpl = 1, C_imp = 1):
 #             find_ideal_C(circ, test_caps=test_caps[new_l_bnd_ind:-1])
 #         else:
 #             find_ideal_C(circ, test_caps=test_caps[1:-2])
+
+
+def find_ideal_C(L, series=True, z_in=50, f_l_bnd=4e9, f_u_bnd=15e9, C_l_bnd=C_l_bnd, C_u_bnd=C_u_bnd, n_scan=33, tol=1e-18):
+    '''
+    Finds the capacitance between C_l_bnd and C_u_bnd which maximizes the peak |dS11/df| within f_l_bnd to f_u_bnd
+    for an inductance L.
+
+    Each capacitance is scored with solve_steep() (analytic S11 model, no sweeps). A coarse scan of n_scan
+    capacitances brackets the best one, which is then refined to within tol (F) with Brent's method.
+    Returns a dictionary with the optimal C, the frequency and derivative at the steepest point, and a trace
+    of every (C, frequency, derivative) that was evaluated, in order.
+    '''
+    trace = []
+
+    def steepness(C):
+        steep_dict = solve_steep(L, C, z_in, series, f_l_bnd, f_u_bnd)
+        trace.append((C, steep_dict["frequency"], steep_dict["derivative"]))
+        return steep_dict["derivative"]
+
+    Cs = np.linspace(C_l_bnd, C_u_bnd, n_scan)
+    derivs = [steepness(C) for C in Cs]
+    max_ind = int(np.argmax(derivs))
+    lower = Cs[max(max_ind - 1, 0)]
+    upper = Cs[min(max_ind + 1, n_scan - 1)]
+
+    if upper - lower > tol:
+        minimize_scalar(lambda C: -steepness(C), bounds=(lower, upper), method='bounded', options={'xatol': tol})
+
+    best = max(trace, key=lambda point: point[2])
+
+    return {"C": best[0],
+            "frequency": best[1],
+            "derivative": best[2],
+            "trace": trace}
+
+
+def find_ideal_Cs(Ls, max_workers=None, **kwargs):
+    '''
+    Runs find_ideal_C() for each inductance in Ls in a process pool. kwargs are passed on to find_ideal_C().
+    Returns a list of results in the same order as Ls.
+    '''
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(partial(find_ideal_C, **kwargs), Ls))
@@ -0,0 +1,256 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+import hashlib
+import threading
+
+import numpy as np
+import matplotlib.pyplot as plt
+
+'''
+------------------
+LIVE TRACE MONITOR
+------------------
+Live plots of simulator graphs without the 200 ms cla()-and-replot loop
+of AWRDE_Tests.py / animate_smooth(): the traces are fetched on a
+background thread, nothing is redrawn unless a trace actually changed,
+changed traces are blitted onto preallocated lines, and every trace is
+decimated to the axes' width in pixels before it's drawn.
+
+    from MWO import connect_mwo
+    from Backends import MWOBackend
+    monitor = LiveMonitor(lambda: MWOBackend(connect_mwo()), ('Parallel', 'Series'))
+    monitor.show()
+---------------------------------------
+'''
+
+
+def init_com():
+    # COM needs initializing on every thread that uses it (pywin32 only does the main thread for you.)
+    try:
+        import pythoncom
+    except ImportError: #Not on Windows, nothing to do.
+        return False
+
+    pythoncom.CoInitialize()
+    return True
+
+
+def uninit_com():
+    import pythoncom
+    pythoncom.CoUninitialize()
+
+
+def decimate_minmax(xs, ys, n_bins):
+    '''
+    Cuts a trace down to (at most about) 2*n_bins points by keeping the
+    min and max of each of n_bins bins, so that it looks exactly the same
+    when drawn n_bins pixels wide. Short traces are returned as they are.
+    '''
+    n_points = len(ys)
+    if n_bins < 1 or n_points <= 2*n_bins:
+        return xs, ys
+
+    bin_size = n_points // n_bins
+    n_used = bin_size * n_bins
+    bins = ys[:n_used].reshape(n_bins, bin_size)
+    offsets = np.arange(n_bins) * bin_size
+
+    inds = np.sort(np.column_stack((bins.argmin(axis=1) + offsets, bins.argmax(axis=1) + offsets)), axis=1).ravel()
+    if n_used < n_points: #Leftover points at the end.
+        tail = ys[n_used:]
+        inds = np.concatenate((inds, np.sort([n_used + np.argmin(tail), n_used + np.argmax(tail)])))
+
+    return xs[inds], ys[inds]
+
+
+class TraceFetcher(threading.Thread):
+    '''
+    Background thread that polls backend.fetch_trace() for every graph in
+    graph_names every interval seconds, and keeps the latest version of
+    each trace that actually changed (by a hash of its data).
+
+    COM objects belong to the thread that created them, so instead of a
+    backend the thread takes backend_factory, a function that makes one.
+    It's called on this thread, after CoInitialize() (on Windows), so for
+    MWO the thread gets its own CMWOffice connection and never has to
+    wait on the main thread's.
+
+    transform(xs, ys) -> (xs, ys), if given, is also run on this thread
+    (e.g. smoothing), only for changed traces.
+    '''
+
+    def __init__(self, backend_factory, graph_names, interval=0.2, transform=None):
+        super().__init__(daemon=True)
+        self.backend_factory = backend_factory
+        self.graph_names = tuple(graph_names)
+        self.interval = interval
+        self.transform = transform
+        self.lock = threading.Lock()
+        self.latest = {}    #graph name -> (version, xs, ys)
+        self.hashes = {}    #graph name -> hash of the last fetched data
+        self.error = None
+        self._stop_event = threading.Event()
+
+    def run(self):
+        com_initialized = init_com()
+        try:
+            backend = self.backend_factory()
+            while not(self._stop_event.is_set()):
+                for name in self.graph_names:
+                    self.poll(backend, name)
+                self._stop_event.wait(self.interval)
+        except Exception as e: #Kept for the main thread to look at, the monitor just stops updating.
+            self.error = e
+            raise
+        finally:
+            if com_initialized:
+                uninit_com()
+
+    def poll(self, backend, name):
+        xs, ys = backend.fetch_trace(name)
+        xs = np.ascontiguousarray(xs, dtype=float)
+        ys = np.ascontiguousarray(ys, dtype=float)
+
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(xs)
+        digest.update(ys)
+        digest = digest.digest()
+        if digest == self.hashes.get(name):
+            return False
+
+        self.hashes[name] = digest
+        if self.transform is not None:
+            xs, ys = self.transform(xs, ys)
+
+        with self.lock:
+            version = self.latest[name][0] + 1 if name in self.latest else 1
+            self.latest[name] = (version, xs, ys)
+
+        return True
+
+    def get(self, name):
+        # (version, xs, ys) of the latest trace of graph name, or None if there isn't one yet.
+        with self.lock:
+            return self.latest.get(name)
+
+    def stop(self):
+        self._stop_event.set()
+
+
+class LiveMonitor():
+    '''
+    One set of axes per graph, each with a single preallocated Line2D.
+    A GUI timer checks the fetcher every interval seconds: if no trace
+    has a new version nothing at all happens, otherwise only the changed
+    lines are restored/drawn/blitted. The axes limits (and so a full
+    redraw) only change when a trace moves outside of them.
+    '''
+
+    def __init__(self, backend_factory, graph_names=('Parallel',), interval=0.2, transform=None, ylabel='|S11|'):
+        self.graph_names = tuple(graph_names)
+        self.fetcher = TraceFetcher(backend_factory, self.graph_names, interval, transform)
+
+        self.fig, axs = plt.subplots(len(self.graph_names), 1, squeeze=False)
+        self.axs = dict(zip(self.graph_names, axs[:, 0]))
+        self.lines = {}
+        for name, ax in self.axs.items():
+            self.lines[name], = ax.plot([], [], 'b', animated=True) #animated: left out of full draws, we draw it ourselves.
+            ax.set_title(name)
+            ax.set_ylabel(ylabel)
+        axs[-1, 0].set_xlabel('frequency')
+
+        self.versions = dict.fromkeys(self.graph_names, 0)
+        self.data = {}          #graph name -> (xs, ys), full resolution
+        self.backgrounds = {}   #graph name -> the axes without its line
+        self.n_redraws = 0
+        self.n_blits = 0
+
+        self.fig.canvas.mpl_connect('draw_event', self.on_draw)
+        self.fig.canvas.mpl_connect('close_event', lambda event: self.stop())
+        self.timer = self.fig.canvas.new_timer(interval=int(interval * 1000))
+        self.timer.add_callback(self.update)
+
+    def set_line(self, name):
+        # Decimates the trace to the current width of its axes.
+        if name in self.data:
+            xs, ys = self.data[name]
+            self.lines[name].set_data(*decimate_minmax(xs, ys, int(self.axs[name].bbox.width)))
+
+    def on_draw(self, event):
+        # After a full draw (first show, resize, new limits): grab the backgrounds and draw the lines on them.
+        canvas = self.fig.canvas
+        for name, ax in self.axs.items():
+            self.backgrounds[name] = canvas.copy_from_bbox(ax.bbox)
+            self.set_line(name)
+            ax.draw_artist(self.lines[name])
+        self.n_redraws += 1
+
+    def needs_rescale(self, name):
+        # Sets new limits if the trace doesn't fit the current ones, returns whether it did.
+        xs, ys = self.data[name]
+        ax = self.axs[name]
+        if not(len(ys)):
+            return False
+
+        rescale = False
+        if ax.get_xlim() != (xs[0], xs[-1]):
+            ax.set_xlim(xs[0], xs[-1])
+            rescale = True
+
+        y_min, y_max = np.nanmin(ys), np.nanmax(ys)
+        y_lo, y_hi = ax.get_ylim()
+        if y_min < y_lo or y_max > y_hi:
+            margin = 0.05 * max(y_max - y_min, 1e-12)
+            ax.set_ylim(y_min - margin, y_max + margin)
+            rescale = True
+
+        return rescale
+
+    def update(self):
+        '''
+        Timer callback: draws whatever changed since the last call.
+        Returns the list of graphs that were updated.
+        '''
+        changed = []
+        for name in self.graph_names:
+            latest = self.fetcher.get(name)
+            if latest is None or latest[0] == self.versions[name]:
+                continue
+
+            self.versions[name], xs, ys = latest
+            self.data[name] = (xs, ys)
+            changed.append(name)
+
+        if not(changed):
+            return changed
+
+        rescale = [self.needs_rescale(name) for name in changed]
+        if any(rescale) or len(self.backgrounds) < len(self.axs):
+            self.fig.canvas.draw_idle() #on_draw() puts the lines back.
+            return changed
+
+        canvas = self.fig.canvas
+        for name in changed:
+            ax = self.axs[name]
+            canvas.restore_region(self.backgrounds[name])
+            self.set_line(name)
+            ax.draw_artist(self.lines[name])
+            canvas.blit(ax.bbox)
+            self.n_blits += 1
+
+        return changed
+
+    def start(self):
+        self.fetcher.start()
+        self.timer.start()
+        return self
+
+    def stop(self):
+        self.timer.stop()
+        self.fetcher.stop()
+
+    def show(self):
+        self.start()
+        plt.show()
+        self.stop()
@@ -0,0 +1,234 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+from contextlib import contextmanager
+
+import numpy as np
+
+'''
+-----------------
+AWR MWO HELPERS
+-----------------
+Helpers around the pyawr COM API that keep the number of COM round
+trips down (each one is slow compared to anything we do in Python.)
+
+    client = SchematicClient(connect_mwo())
+    client.bind_schematic('Inductor_Subcircuit')
+    with client.batch():
+        for cap in caps:
+            client.set_params('Inductor_Subcircuit', CAP=cap)   #only writes CAP, once per changed value
+    #one Simulator.Analyze() here
+
+    pool = GraphPool(client.awrde, client)
+    freqs, s21s = pool.get_trace('Hanger_Test', 'S(2,1)')   #same graph every time, no Analyze() unless something changed
+    pool.close()
+---------------------------------------
+'''
+
+ELEMENTS = {'CAP': 1, 'IND': 2, 'RES': 3} #Component -> element index in Inductor_Subcircuit, the value is Parameters(2).
+
+
+def connect_mwo():
+    import pyawr.mwoffice as mwo #Only available where AWR is installed.
+    return mwo.CMWOffice()
+
+
+class SchematicClient():
+    '''
+    Replacement for set_circ_params() from the notebooks.
+
+    bind_schematic() looks up the element parameter handles once and
+    reads their values once. After that, set_params() compares against
+    those cached values and only writes the parameters that actually
+    changed, and Simulator.Analyze() is only run if something changed
+    since the last analysis. Inside a batch() block the analysis is put
+    off until the block ends, so a batch of updates costs one Analyze().
+
+    The cached values are only what this client last read or wrote, so
+    call refresh() if values were changed in MWO by hand.
+    '''
+
+    def __init__(self, awrde=None):
+        self.awrde = connect_mwo() if awrde is None else awrde
+        self.handles = {}   #schematic -> {component: Parameter handle}
+        self.values = {}    #schematic -> {component: last known value}
+        self.dirty = False  #Whether anything changed since the last analysis.
+        self.n_writes = 0
+        self.n_analyses = 0
+        self._batch_depth = 0
+
+    def bind_schematic(self, circ_name='Inductor_Subcircuit', elements=None):
+        '''
+        Resolves and caches the parameter handles of circ_name's elements
+        (ELEMENTS by default) and reads their current values.
+        '''
+        elements = ELEMENTS if elements is None else elements
+        schematic = self.awrde.Project.Schematics(circ_name)
+
+        self.handles[circ_name] = {key: schematic.Elements(ind).Parameters(2) for key, ind in elements.items()}
+        self.refresh(circ_name)
+
+        return self.get_params(circ_name)
+
+    def get_handles(self, circ_name):
+        if circ_name not in self.handles:
+            self.bind_schematic(circ_name)
+
+        return self.handles[circ_name]
+
+    def refresh(self, circ_name='Inductor_Subcircuit'):
+        # Rereads the values of circ_name from MWO.
+        self.values[circ_name] = {key: param.ValueAsDouble for key, param in self.get_handles(circ_name).items()}
+
+    def get_params(self, circ_name='Inductor_Subcircuit'):
+        self.get_handles(circ_name)
+        return dict(self.values[circ_name])
+
+    def set_params(self, circ_name='Inductor_Subcircuit', analyze=True, **kwargs):
+        '''
+        Sets the given components of circ_name, writing only the ones whose
+        value changed, then analyzes (unless analyze is False or we're in a
+        batch.) Unknown components raise a KeyError before anything is
+        written. Returns a dictionary with the new values.
+        '''
+        handles = self.get_handles(circ_name)
+        unknown = set(kwargs) - set(handles)
+        if unknown:
+            raise KeyError("Schematic {} has no element(s) {}.".format(circ_name, sorted(unknown)))
+
+        values = self.values[circ_name]
+        for key, value in kwargs.items():
+            if values[key] != value:
+                handles[key].ValueAsDouble = value
+                values[key] = value
+                self.n_writes += 1
+                self.dirty = True
+
+        if analyze and not(self._batch_depth):
+            self.analyze()
+
+        return dict(values)
+
+    def invalidate(self):
+        # For changes made around the client (e.g. new project frequencies) that need a new analysis.
+        self.dirty = True
+
+    def analyze(self, force=False):
+        # Runs Simulator.Analyze() if anything changed since the last one (or if force.)
+        if self.dirty or force:
+            self.awrde.Project.Simulator.Analyze()
+            self.n_analyses += 1
+            self.dirty = False
+
+    @contextmanager
+    def batch(self):
+        '''
+        Puts off the analysis until the (outermost) block ends, then
+        analyzes once if anything changed.
+        '''
+        self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            self._batch_depth -= 1
+
+        if not(self._batch_depth):
+            self.analyze()
+
+
+class GraphPool():
+    '''
+    Helper graphs for reading measurements (like the polar "CalcHelper"
+    graphs from create_polar_graph() in circle_fit.ipynb), created once
+    per (schematic, measurement) the first time they're asked for and
+    then reused, instead of being added and deleted around every fit.
+
+    Graphs are looked up in a dictionary, and ones left in the project by
+    an earlier session (same name) are picked up rather than duplicated.
+    close() removes all of them. Given a SchematicClient, traces are read
+    after client.analyze(), so there's only an analysis if a parameter
+    changed (or a graph was just added.)
+    '''
+
+    def __init__(self, awrde=None, client=None, graph_type=None, prefix='CalcHelper'):
+        self.awrde = connect_mwo() if awrde is None else awrde
+        self.client = client
+
+        if graph_type is None:
+            import pyawr.mwoffice as mwo
+            graph_type = mwo.mwGraphType.mwGT_Polar
+        self.graph_type = graph_type
+        self.prefix = prefix
+        self.graphs = {}        #(schematic, measurement) -> graph
+        self.leftovers = None   #Names of the graphs the project had before we added any.
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def graph_name(self, schem_name, measurement):
+        return "{} {} {}".format(self.prefix, schem_name, measurement)
+
+    def project_graph_names(self):
+        # Name -> index (1 based) of every graph in the project, in one pass.
+        graphs = self.awrde.Project.Graphs
+        return {graphs.Item(ind).Name: ind for ind in range(1, graphs.Count + 1)}
+
+    def get_graph(self, schem_name='Hanger_Test', measurement='S(2,1)'):
+        key = (schem_name, measurement)
+        if key in self.graphs:
+            return self.graphs[key]
+
+        name = self.graph_name(schem_name, measurement)
+        graphs = self.awrde.Project.Graphs
+        if self.leftovers is None: #Graphs already in the project, looked up once.
+            self.leftovers = set(self.project_graph_names())
+
+        if name in self.leftovers:
+            graph = graphs(name)
+        else:
+            graph = graphs.Add(name, self.graph_type)
+            graph.Measurements.Add(schem_name, measurement)
+            if self.client is not None:
+                self.client.invalidate()
+            else:
+                self.awrde.Project.Simulator.Analyze() #The new measurement has no data until the next analysis.
+
+        self.graphs[key] = graph
+        return graph
+
+    def get_trace(self, schem_name='Hanger_Test', measurement='S(2,1)'):
+        '''
+        Returns (freqs, values) of the measurement, values complex for
+        polar graphs (from TraceValues, like get_meas_vals()), real
+        otherwise.
+        '''
+        meas = self.get_graph(schem_name, measurement).Measurements[0]
+        if self.client is not None:
+            self.client.analyze()
+
+        trace = np.asarray(meas.TraceValues(1), dtype=float)
+        if trace.shape[1] > 2:
+            return trace[:, 0], trace[:, 1] + 1j*trace[:, 2]
+
+        return trace[:, 0], trace[:, 1]
+
+    def close(self):
+        '''
+        Removes all the pool's graphs from the project. Indices are looked
+        up once and removed from the highest down, so removing one doesn't
+        shift the ones still to go.
+        '''
+        if not(self.graphs):
+            return
+
+        names = {self.graph_name(*key) for key in self.graphs}
+        inds = [ind for name, ind in self.project_graph_names().items() if name in names]
+
+        for ind in sorted(inds, reverse=True):
+            self.awrde.Project.Graphs.Remove(ind)
+
+        self.graphs = {}
+        self.leftovers = None
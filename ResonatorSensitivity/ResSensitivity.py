@@ -5,6 +5,219 @@ import os
 import time
 import numpy as np
 import matplotlib.pyplot as plt
+from scipy.optimize import minimize_scalar, brentq
+
+
+def calc_z_w(ws, L, C, series):
+    '''
+    Impedance of the circuit at the angular frequencies ws (rad/s). Same model as Circuit.calc_z().
+    '''
+    if series:
+        Z_C = np.complex128(1.0j/(ws*C))
+        Z_L = np.complex128(1.0j*ws*L)
+        return np.sqrt(np.square(Z_L + Z_C))
+
+    return np.complex128(-1.0j)*(L/C)/(ws*L - (1.0/(ws*C)))
+
+
+def calc_s11_w(ws, L, C, z_in, series):
+    '''
+    S11 of the circuit at the angular frequencies ws (rad/s). Same model as Circuit.calc_s11().
+    '''
+    zs = calc_z_w(ws, L, C, series)
+    return (z_in - (z_in + zs))/(z_in + (z_in + zs))
+
+
+def calc_ds11_df(fs, L, C, z_in, series):
+    '''
+    Analytic derivative of S11 w.r.t. frequency (1/Hz) at the frequencies fs (Hz). Works on arrays and plain floats.
+
+    S11 = -Z/(2z_in + Z), so dS11/df = -2z_in/(2z_in + Z)^2 * dZ/dw * 2pi.
+    For positive frequencies the series Z is j(wL + 1/(wC)) and the parallel one is -j(L/C)/(wL - 1/(wC)).
+    '''
+    ws = 2*np.pi*fs
+
+    if series:
+        zs = 1.0j*(ws*L + 1.0/(ws*C))
+        dzs = 1.0j*(L - 1.0/(ws*ws*C))
+    else:
+        d = ws*L - 1.0/(ws*C)
+        zs = -1.0j*(L/C)/d
+        dzs = 1.0j*(L/C)*(L + 1.0/(ws*ws*C))/(d*d)
+
+    return -2.0*z_in/(2.0*z_in + zs)**2 * dzs * 2*np.pi
+
+
+def calc_d2s11_df2(fs, L, C, z_in, series):
+    '''
+    Analytic second derivative of S11 w.r.t. frequency (1/Hz^2), same model and conventions as calc_ds11_df().
+
+    d2S11/dw2 = -2z_in*(Z''(2z_in + Z) - 2Z'^2)/(2z_in + Z)^3, times (2pi)^2 for f.
+    '''
+    ws = 2*np.pi*fs
+
+    if series:
+        zs = 1.0j*(ws*L + 1.0/(ws*C))
+        dzs = 1.0j*(L - 1.0/(ws*ws*C))
+        d2zs = 2.0j/(ws*ws*ws*C)
+    else:
+        d = ws*L - 1.0/(ws*C)
+        dd = L + 1.0/(ws*ws*C)
+        d2d = -2.0/(ws*ws*ws*C)
+        zs = -1.0j*(L/C)/d
+        dzs = 1.0j*(L/C)*dd/(d*d)
+        d2zs = 1.0j*(L/C)*(d2d*d - 2.0*dd*dd)/(d*d*d)
+
+    return -2.0*z_in*(d2zs*(2.0*z_in + zs) - 2.0*dzs*dzs)/(2.0*z_in + zs)**3 * (2*np.pi)**2
+
+
+def iter_s11_batch(Ls, Cs, z_ins, fs, series, max_elements=2**22):
+    '''
+    Generator version of calc_s11_batch(). Yields (rows, block) pairs, where block is the S11 of the circuits in
+    the slice rows over all of fs, and no block has more than max_elements entries. Handy for reducing big scans
+    (e.g. taking the max slope per circuit) without ever holding the whole matrix.
+    '''
+    Ls, Cs, z_ins, series = np.broadcast_arrays(np.ravel(Ls), np.ravel(Cs), np.ravel(z_ins), np.ravel(series))
+    ws = 2*np.pi*np.asarray(fs, dtype=float)[np.newaxis, :]
+    n_params = len(Ls)
+    chunk = max(1, max_elements // ws.shape[1])
+
+    for start in range(0, n_params, chunk):
+        rows = slice(start, min(start + chunk, n_params))
+        block = np.empty((rows.stop - rows.start, ws.shape[1]), dtype=np.complex128)
+        ser = series[rows].astype(bool)
+
+        for flag in (True, False):  # Each row gets the series or the parallel model.
+            mask = ser == flag
+            if mask.any():
+                block[mask] = calc_s11_w(ws, Ls[rows][mask, np.newaxis], Cs[rows][mask, np.newaxis],
+                                         z_ins[rows][mask, np.newaxis], flag)
+
+        yield rows, block
+
+
+def calc_s11_batch(Ls, Cs, z_ins, fs, series, max_elements=2**22):
+    '''
+    S11 of many circuits over the frequencies fs (Hz) at once, returned as an (n_params x n_freqs) complex array.
+
+    Ls, Cs, z_ins and series are broadcast against each other, so e.g. a 100x100 L/C scan is just
+    calc_s11_batch(L_grid.ravel(), C_grid.ravel(), 50, fs, True). Rows are evaluated in chunks of at most
+    max_elements entries, so the temporaries stay small no matter how many circuits there are.
+    '''
+    n_params = np.broadcast(np.ravel(Ls), np.ravel(Cs), np.ravel(z_ins), np.ravel(series)).size
+    s11s = np.empty((n_params, len(fs)), dtype=np.complex128)
+
+    for rows, block in iter_s11_batch(Ls, Cs, z_ins, fs, series, max_elements):
+        s11s[rows] = block
+
+    return s11s
+
+
+_STEEP_GRID = np.linspace(0.0, 1.0, 257)         # Coarse grid across the band (as a fraction of it)...
+_STEEP_OFFSETS = np.geomspace(1e-9, 1.0, 64)     # ...plus relative offsets from the resonant frequency, for narrow features.
+
+def solve_steep(L, C, z_in, series, f_l_bnd, f_u_bnd, tol=1.0):
+    '''
+    Finds the frequency (Hz) between f_l_bnd and f_u_bnd where |dS11/df| is largest, to within tol Hz.
+
+    |dS11/df| is evaluated analytically on a small grid which is dense close to the resonant frequency
+    (where the features are, however narrow) to bracket the peak, which is then refined with Brent's method.
+    Singular points (e.g. 0 Hz) are ignored; if there's nothing finite in the band both values are NaN.
+    Returns a dictionary with the frequency (Hz) and the derivative magnitude there.
+    '''
+    f_r = 1/(2*np.pi*np.sqrt(L*C))
+    fs = np.concatenate((f_l_bnd + (f_u_bnd - f_l_bnd)*_STEEP_GRID, f_r*(1.0 - _STEEP_OFFSETS), f_r*(1.0 + _STEEP_OFFSETS)))
+    fs = np.sort(fs[(fs >= f_l_bnd) & (fs <= f_u_bnd)])
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        slopes = np.abs(calc_ds11_df(fs, L, C, z_in, series))
+    finite = np.isfinite(slopes)  # Singular points (e.g. 0 Hz) can't be the answer.
+    fs, slopes = fs[finite], slopes[finite]
+    if not(len(fs)):
+        return {"frequency": np.nan, "derivative": np.nan}
+
+    max_ind = np.nanargmax(slopes)
+    max_freq = fs[max_ind]
+    max_slope = slopes[max_ind]
+    lower = fs[max(max_ind - 1, 0)]
+    upper = fs[min(max_ind + 1, len(fs) - 1)]
+
+    if 0 < max_ind < len(fs) - 1 and upper - lower > tol:  # If it's steepest at a band edge, that edge is the answer (like argmax over a sweep).
+        # The peak of |S11'| is where d|S11'|^2/df = 2Re(S11'' conj(S11')) crosses zero. Finding that root (rather than
+        # maximizing |S11'|, which is flat at the top) and working with the offset u from lower (so the solver's
+        # relative tolerance is negligible) gets the frequency to within tol, even for tol well under 1 Hz.
+        def slope_change(u):
+            return np.real(calc_d2s11_df2(lower + u, L, C, z_in, series) * np.conj(calc_ds11_df(lower + u, L, C, z_in, series)))
+
+        def neg_slope(u):
+            slope = abs(calc_ds11_df(lower + u, L, C, z_in, series))
+            return -slope if np.isfinite(slope) else 0.0
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            if slope_change(0.0) > 0 > slope_change(upper - lower):
+                u = brentq(slope_change, 0.0, upper - lower, xtol=tol)
+            else:  # No clean sign change (shouldn't happen for this model), fall back to maximizing directly.
+                u = minimize_scalar(neg_slope, bounds=(0.0, upper - lower), method='bounded', options={'xatol': tol}).x
+
+            if -neg_slope(u) > max_slope:
+                max_freq = lower + u
+                max_slope = -neg_slope(u)
+
+    return {"frequency": float(max_freq),
+            "derivative": float(max_slope)}
+
+
+class CircuitSpec():
+    '''
+    Frozen record of everything needed to build a Circuit (same argument order as Circuit).
+
+    Values are checked on creation and a ValueError is raised for anything missing or invalid, nothing is ever
+    prompted for. It's just a few slots, so making millions of them for a design-space sweep is cheap, and it
+    pickles, so it can be sent to worker processes. Build the actual circuit with Circuit.from_spec().
+    '''
+    __slots__ = ('is_series', 'L', 'C', 'stp_size', 'z_in', 'w_l_bnd', 'w_u_bnd')
+
+    def __init__(self, series, L, C, stp_size=1000, z_in=50, w_l_bnd=4e9, w_u_bnd=8e9):
+        if series is None:
+            raise ValueError("series must be True (series) or False (parallel).")
+        if not(L > 0 and C > 0):
+            raise ValueError("L and C must both be positive, got L={}, C={}.".format(L, C))
+        if not(z_in):
+            raise ValueError("z_in must be a non-zero impedance, got {}.".format(z_in))
+        if not(stp_size > 0 and w_l_bnd < w_u_bnd):
+            raise ValueError("Invalid sweep: {}-{} Hz in steps of {} Hz.".format(w_l_bnd, w_u_bnd, stp_size))
+
+        for name, value in zip(self.__slots__, (bool(series), L, C, stp_size, z_in, w_l_bnd, w_u_bnd)):
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("CircuitSpec is frozen, use replace() to get a modified copy.")
+
+    def __delattr__(self, name):
+        raise AttributeError("CircuitSpec is frozen.")
+
+    def __reduce__(self):  # The default pickling would go through the frozen __setattr__.
+        return (CircuitSpec, self.as_tuple())
+
+    def __eq__(self, other):
+        return isinstance(other, CircuitSpec) and self.as_tuple() == other.as_tuple()
+
+    def __hash__(self):
+        return hash(self.as_tuple())
+
+    def __repr__(self):
+        return 'CircuitSpec({})'.format(', '.join('{}={!r}'.format(name, value) for name, value in zip(self.__slots__, self.as_tuple())))
+
+    def as_tuple(self):
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    def replace(self, **changes):
+        values = dict(zip(self.__slots__, self.as_tuple()))
+        values.update(changes)
+        values['series'] = values.pop('is_series')
+
+        return CircuitSpec(**values)
+
 
 class Circuit():
     is_series = None            #True for series circuit, false for parallel.
@@ -13,13 +226,18 @@ class Circuit():
     z_in = None                 #Input impedance (Ohm)
     w_r = None                  #Resonant frequency (Hz)
     step_size = None            #Frequency sweep step size (Hz)
-    f_sweep = None              #Frequency sweep (Hz)
-    w_sweep = None              #Angular frequency sweep (rad/s)
-    s11 = None                  #S11 reflection coefficients.
     w_l_bnd = None              #Frequency sweep lower bound (rad/s)
     w_u_bnd = None              #Frequency sweep upper bound (rad/s)
+    cache = None                #Lazily computed arrays: f_sweep (Hz), w_sweep (rad/s), z, s11 and slopes.
+    interactive = True          #Prompt for missing values (True) or raise a ValueError (False).
 
-    def __init__(self, series=None, L=None, C=None, stp_size=1000, z_in=50, w_l_bnd=4e9, w_u_bnd=8e9):
+    SWEEP_KEYS = ('f_sweep', 'w_sweep', 'z', 's11', 'slopes')   #Cache entries that depend on the sweep bounds or step...
+    MODEL_KEYS = ('z', 's11', 'slopes')                         #...on L, C or series/parallel...
+    S11_KEYS = ('s11', 'slopes')                                #...and on the input impedance.
+
+    def __init__(self, series=None, L=None, C=None, stp_size=1000, z_in=50, w_l_bnd=4e9, w_u_bnd=8e9, interactive=True):
+        self.cache = {}
+        self.interactive = interactive
         self.set_w_l_bnd(w_l_bnd)
         self.set_w_u_bnd(w_u_bnd)
         self.set_LC(L, C)
@@ -41,26 +259,43 @@ class Circuit():
 
         return str(dict)
 
+    @classmethod
+    def from_spec(cls, spec):
+        # Builds a non-interactive circuit from a CircuitSpec. Safe to use in scripts, worker processes, servers...
+        return cls(spec.is_series, spec.L, spec.C, spec.stp_size, spec.z_in, spec.w_l_bnd, spec.w_u_bnd, interactive=False)
+
+    def get_spec(self):
+        return CircuitSpec(self.get_is_series(), self.get_L(), self.get_C(), self.get_stp_size(), self.get_Z_in(),
+                           self.get_w_l_bnd(), self.get_w_u_bnd())
+
 
     def set_par_or_ser(self, ser=None):
-        if ser == None:
+        if ser == None and not(self.interactive):
+            raise ValueError("Series or parallel circuit not specified.")
+
+        while ser == None:
             par_or_ser = input("Is this a parallel or a series circuit? (P/S):")
 
             if par_or_ser == "P" or par_or_ser == "p":
-                self.is_series = False
+                ser = False
 
             elif par_or_ser == "S" or par_or_ser == "s":
-                self.is_series = True
+                ser = True
 
             else:
                 print("Invalid selection!")
-                self.set_par_or_ser()
 
-        else:
+        if ser != self.is_series:
             self.is_series = ser
+            self.invalidate(*self.MODEL_KEYS)
 
     #TODO: Logic does not account for changing only one of two
     def set_LC(self, ind=None, cap=None):
+        old_LC = (self.L, self.C)
+
+        if not(self.interactive) and not(ind and cap):
+            raise ValueError("L and C must both be given, got L={}, C={}.".format(ind, cap))
+
         if not(ind or cap):
             #NOTE: subdivisions smaller than nH and fF will probably break things.
             if not(ind) and not(cap):
@@ -81,22 +316,55 @@ class Circuit():
             self.L = ind
             self.C = cap
 
+        if (self.L, self.C) != old_LC:
+            self.invalidate(*self.MODEL_KEYS)
+
         # print("DEBUG: L={}, C={}".format(self.get_L(), self.get_C()))
 
     def set_Z_in(self, z_in=None):
-        if not(z_in):
+        old_z_in = self.z_in
+
+        if not(z_in) and not(self.interactive):
+            raise ValueError("Input impedance not specified.")
+
+        elif not(z_in):
             cpx_str = input("Please input an input impedance value (Ohms, in complex form):")
             self.z_in = np.complex128(cpx_str)
 
         else:
             self.z_in = z_in
 
+        if self.z_in != old_z_in:
+            self.invalidate(*self.S11_KEYS)
+
 
     def set_w_l_bnd(self, l_bound=None):
-        self.w_l_bnd = l_bound
+        if l_bound != self.w_l_bnd:
+            self.w_l_bnd = l_bound
+            self.invalidate(*self.SWEEP_KEYS)
 
     def set_w_u_bnd(self, u_bound=None):
-        self.w_u_bnd = u_bound
+        if u_bound != self.w_u_bnd:
+            self.w_u_bnd = u_bound
+            self.invalidate(*self.SWEEP_KEYS)
+
+    def invalidate(self, *keys):
+        # Drops the given cached arrays (all of them if no keys are given) so they get recomputed next time they're needed.
+        if not(keys):
+            keys = self.SWEEP_KEYS
+
+        for key in keys:
+            self.cache.pop(key, None)
+
+    def cached(self, key, calc):
+        # Returns the cached array called key, calculating it with calc() first if needed. Cached arrays are read-only,
+        # since every caller gets the same one.
+        if key not in self.cache:
+            arr = calc()
+            arr.flags.writeable = False
+            self.cache[key] = arr
+
+        return self.cache[key]
 
     def reset_bounds(self, center=6e9, rng=1e9):
         step = self.get_stp_size()
@@ -135,16 +403,18 @@ class Circuit():
         return self.is_series
 
     def get_f_sweep(self):
-        return self.f_sweep
+        return self.cached('f_sweep', lambda: np.arange(self.get_w_l_bnd(), self.get_w_u_bnd(), self.get_stp_size()))
 
     def get_w_sweep(self):
-        return self.w_sweep
+        return self.cached('w_sweep', lambda: self.get_f_sweep()*2*np.pi)
 
     def get_stp_size(self):
         return self.step_size
 
     def set_stp_size(self, stp_size=5):
-        self.step_size = stp_size
+        if stp_size != self.step_size:
+            self.step_size = stp_size
+            self.invalidate(*self.SWEEP_KEYS)
 
     def set_res_freq(self):
         self.w_r = 1/(2*np.pi*np.sqrt(self.get_L()*self.get_C()))
@@ -152,9 +422,8 @@ class Circuit():
         # print("DEBUG: w_r={}".format(self.get_res_freq()))
 
     def set_f_sweep(self, step):
-        freq_sweep = np.arange(self.get_w_l_bnd(), self.get_w_u_bnd(), step)
-        self.f_sweep = freq_sweep
-        self.w_sweep = freq_sweep*2*np.pi
+        # The sweep itself is only built when it's first needed (see get_f_sweep()).
+        self.set_stp_size(step)
         # print("DEBUG: f_sweep={}".format(self.get_f_sweep()))
 
     def check_in_bounds(self, lower_bound=None, upper_bound=None, frequency=None):
@@ -162,6 +431,8 @@ class Circuit():
 
         if lower_bound <= frequency <= upper_bound:
             in_bounds = True
+        elif not(self.interactive):
+            in_bounds = False
         else:
             print("The resonant frequency of {} GHz is not within your bound of {} GHz to {} GHz. Do you want to change L or C?".format(frequency/1e9, lower_bound/1e9, upper_bound/1e9))
             yes_or_no = input("Y/N:")
@@ -178,40 +449,95 @@ class Circuit():
         # print("DEBUG: lower_bound={}={}, upper_bound={}={}, frequency={}={}".format(self.w_l_bnd, lower_bound, self.w_u_bnd, upper_bound, self.get_res_freq(), frequency))
 
     def calc_z(self):
-        series = self.get_is_series()
-        ws = self.get_w_sweep()
-        zs = np.zeros_like(ws, dtype=np.complex128)
-        C = self.get_C()
-        L = self.get_L()
-
-        if series:
-            Z_C = np.complex128(1.0j/(ws*C))
-            Z_L = np.complex128(1.0j*ws*L)
-            zs = np.sqrt(np.square(Z_L + Z_C))
-            # print("DEBUG: series")
-
-        elif not(series):
-            zs = np.complex128(-1.0j)*(L/C)/(ws*L - (1.0/(ws*C)) )
-            # print("DEBUG: not series")
+        zs = self.cached('z', lambda: calc_z_w(self.get_w_sweep(), self.get_L(), self.get_C(), self.get_is_series()))
 
         return zs
 
     def calc_s11(self):
-        gs = np.zeros_like(self.get_w_sweep())
-        zs = self.calc_z()
-        z_in = self.get_Z_in()
+        def calc():
+            zs = self.calc_z()
+            z_in = self.get_Z_in()
 
-        gs = (z_in - (z_in + zs))/(z_in + (z_in + zs))
+            return (z_in - (z_in + zs))/(z_in + (z_in + zs))
+
+        gs = self.cached('s11', calc)
 
         return gs
 
     def get_slopes(self, gammas=None):
         # Calculates the discrete derivative of S11 w.r.t. frequency and returns the absolute value of derivative array.
-        dgs = np.gradient(gammas, self.get_stp_size())
-        dgs = np.abs(dgs)                          # We only care about the magnitude of the slope.
-        dgs = np.append(dgs, dgs[-1])  # Just some dimension housekeeping. Duplicated and appended the last element.
-
-        return dgs
+        # Without gammas (or with the circuit's own calc_s11()), the cached slopes are used.
+        def calc(gammas):
+            dgs = np.gradient(gammas, self.get_stp_size())
+            dgs = np.abs(dgs)                          # We only care about the magnitude of the slope.
+            dgs = np.append(dgs, dgs[-1])  # Just some dimension housekeeping. Duplicated and appended the last element.
+
+            return dgs
+
+        if gammas is None or gammas is self.cache.get('s11'):
+            return self.cached('slopes', lambda: calc(self.calc_s11()))
+
+        return calc(gammas)
+
+    def calc_s11_LC(self, Ls, Cs, z_ins=None):
+        # S11 over f_sweep for arrays of L and C (and optionally z_in) at once. Returns an (n_params x n_freqs) array.
+        if z_ins is None:
+            z_ins = self.get_Z_in()
+
+        return calc_s11_batch(Ls, Cs, z_ins, self.get_f_sweep(), self.get_is_series())
+
+    def iter_sweep(self, step=None, chunk_size=2**20):
+        # Streams the sweep from w_l_bnd to w_u_bnd (same points as set_f_sweep()) chunk_size points at a time, yielding
+        # (frequencies, S11, |dS11/df|) blocks. Nothing the size of the whole sweep is ever allocated, so the step can be as
+        # fine as you like. Slopes come from the analytic derivative, so blocks don't need to overlap.
+        if step is None:
+            step = self.get_stp_size()
+
+        l_bnd = self.get_w_l_bnd()
+        n_points = int(np.ceil((self.get_w_u_bnd() - l_bnd)/step))
+
+        for start in range(0, n_points, chunk_size):
+            fs = l_bnd + step*np.arange(start, min(start + chunk_size, n_points))
+            gammas = calc_s11_w(fs*2*np.pi, self.get_L(), self.get_C(), self.get_Z_in(), self.get_is_series())
+            slopes = np.abs(calc_ds11_df(fs, self.get_L(), self.get_C(), self.get_Z_in(), self.get_is_series()))
+
+            yield fs, gammas, slopes
+
+    def sweep_reduce(self, step=None, chunk_size=2**20):
+        # Runs iter_sweep() and keeps running reductions in constant memory. Returns the steepest point (like find_steep(), but
+        # with the frequency in Hz), the point with the smallest |S11| and the number of points swept.
+        reduced = {"frequency": None, "derivative": -np.inf, "min_s11_frequency": None, "min_s11": np.inf, "n_points": 0}
+
+        for fs, gammas, slopes in self.iter_sweep(step, chunk_size):
+            # Singular points (NaN/inf, e.g. at 0 Hz) are skipped rather than allowed to win or spoil the whole chunk.
+            finite = np.isfinite(slopes)
+            if finite.any():
+                max_ind = np.nanargmax(np.where(finite, slopes, np.nan))
+                if slopes[max_ind] > reduced["derivative"]:
+                    reduced["frequency"] = float(fs[max_ind])
+                    reduced["derivative"] = float(slopes[max_ind])
+
+            mags = np.abs(gammas)
+            finite = np.isfinite(mags)
+            if finite.any():
+                min_ind = np.nanargmin(np.where(finite, mags, np.nan))
+                if mags[min_ind] < reduced["min_s11"]:
+                    reduced["min_s11_frequency"] = float(fs[min_ind])
+                    reduced["min_s11"] = float(mags[min_ind])
+
+            reduced["n_points"] += len(fs)
+
+        return reduced
+
+    def calc_ds11(self):
+        # Analytic dS11/df over f_sweep (complex, 1/Hz). Unlike get_slopes() there's no finite differencing.
+        return calc_ds11_df(self.get_f_sweep(), self.get_L(), self.get_C(), self.get_Z_in(), self.get_is_series())
+
+    def find_steep_analytic(self, tol=1.0):
+        # Returns the frequency (Hz, as a float) of the steepest part of S11 within the sweep bounds, to within tol Hz.
+        # Same idea as find_steep(), but uses the analytic derivative and never builds a sweep.
+        return solve_steep(self.get_L(), self.get_C(), self.get_Z_in(), self.get_is_series(),
+                           self.get_w_l_bnd(), self.get_w_u_bnd(), tol)
 
     def find_steep(self, slopes=None, gammas=None):
         # Returns the frequency which corresponds to the steepest part of S11 (to maximize sensitivity.)
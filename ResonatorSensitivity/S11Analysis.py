@@ -0,0 +1,94 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+import os
+import glob
+import numpy as np
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor
+
+from TraceIO import load_traces
+from Smoothing import smooth
+
+'''
+--------------------
+OFFLINE S11 ANALYSIS
+--------------------
+The smoothing -> derivative -> steepest point pipeline from
+get_measurements() in putting_it_together.ipynb, without needing AWR:
+it works on plain arrays or on exported trace files (see TraceIO), and
+can crunch a whole folder of exports in a process pool.
+
+    results = analyze_directory('exports')
+    for path, traces in results.items():
+        print(path, [trace["frequency"] for trace in traces])
+---------------------------------------
+'''
+
+
+def get_measurements(xs, ys, window_length=51, polyorder=3):
+    '''
+    Same as get_measurements() in the notebook, but on arrays: returns
+    (xs, abs_dys_savgol, ys_savgol), the Savitzky-Golay smoothed |S11|
+    and the magnitude of its smoothed derivative (both from one
+    Smoothing.smooth() pass.)
+
+    The derivative is w.r.t. x (xs can be unevenly spaced), rather than
+    per point like in the notebook. That doesn't move the steepest point
+    on an even grid.
+    '''
+    xs = np.asarray(xs, dtype=float)
+    ys_savgol, dys_savgol = smooth(xs, ys, window_length, polyorder)
+    abs_dys_savgol = np.abs(dys_savgol)
+
+    return (xs, abs_dys_savgol, ys_savgol)
+
+
+def find_steepest(xs, ys, window_length=51, polyorder=3):
+    '''
+    Returns the steepest point of the smoothed trace: its x value, the
+    derivative there and the smoothed y value there.
+    '''
+    xs, abs_dys_savgol, ys_savgol = get_measurements(xs, ys, window_length, polyorder)
+    max_ind = np.argmax(abs_dys_savgol)
+
+    return {"frequency": float(xs[max_ind]),
+            "derivative": float(abs_dys_savgol[max_ind]),
+            "s11": float(ys_savgol[max_ind])}
+
+
+def analyze_trace(trace, window_length=51, polyorder=3):
+    # find_steepest() for a TraceIO.Trace, with frequencies in Hz, plus where the trace came from.
+    steep_dict = find_steepest(trace.get_freqs_hz(), trace.ys, window_length, polyorder)
+    steep_dict.update(measurement=trace.measurement, schematic=trace.schematic)
+
+    return steep_dict
+
+
+def analyze_file(path, window_length=51, polyorder=3):
+    # analyze_trace() for every trace in an exported file.
+    return [analyze_trace(trace, window_length, polyorder) for trace in load_traces(path)]
+
+
+def analyze_file_or_error(path, window_length=51, polyorder=3):
+    # analyze_file(), but returns the exception instead of raising it, so one bad file doesn't sink a whole batch.
+    try:
+        return analyze_file(path, window_length, polyorder)
+    except Exception as e:
+        return e
+
+
+def analyze_directory(folder, pattern='*.txt', max_workers=None, window_length=51, polyorder=3):
+    '''
+    Runs analyze_file() on every export matching pattern in folder, spread
+    over a process pool. Returns a dictionary of path -> list of results
+    (one per trace), sorted by path. Files that can't be analyzed (too
+    short, malformed...) don't stop the run: their entry is the exception
+    that was raised instead.
+    '''
+    paths = sorted(glob.glob(os.path.join(folder, pattern)))
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        results = executor.map(partial(analyze_file_or_error, window_length=window_length, polyorder=polyorder), paths,
+                               chunksize=max(1, len(paths) // (4*(max_workers or os.cpu_count()))))
+        return dict(zip(paths, results))
@@ -0,0 +1,228 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+from functools import lru_cache
+
+import numpy as np
+from scipy.signal import savgol_coeffs, oaconvolve
+
+'''
+-----------------------
+SAVITZKY-GOLAY ENGINE
+-----------------------
+The smoothed trace and its derivative in one pass, instead of two
+savgol_filter() calls (one with deriv=1) on the whole trace every time:
+
+    ys_savgol, dys_savgol = smooth(xs, ys, window_length=51, polyorder=3)
+
+The value and derivative kernels (plus the ones for the edge points) are
+computed once per (window_length, polyorder, delta) and cached, and both
+are applied in a single (overlap-add) convolution call.
+Edges are handled like savgol_filter(mode='interp'). Non-uniform
+frequency grids get a local least-squares fit per point instead, and
+StreamingSavgol does the uniform case chunk by chunk (e.g. for traces
+that arrive in pieces, or are too long to hold twice.)
+---------------------------------------
+'''
+
+
+def fit_window(n_points, window_length, polyorder):
+    # Shrinks the Savitzky-Golay window for short traces (it has to be odd, > polyorder and no longer than the trace.)
+    window_length = min(window_length, n_points if n_points % 2 else n_points - 1)
+
+    if window_length <= polyorder:
+        raise ValueError("Trace of {} points is too short for a polyorder {} filter.".format(n_points, polyorder))
+
+    return window_length
+
+
+def check_window(window_length, polyorder):
+    if window_length % 2 == 0 or window_length <= polyorder:
+        raise ValueError("window_length must be odd and > polyorder, got {} and {}.".format(window_length, polyorder))
+
+
+@lru_cache(maxsize=64)
+def savgol_kernels(window_length, polyorder, delta=1.0):
+    '''
+    Returns (kernel, left, right), all read-only:
+        kernel: (2, window_length), value and derivative weights for a window's center point
+        left:   (window_length // 2, 2, window_length), the same for the first points, from the first window
+        right:  (window_length // 2, 2, window_length), the same for the last points, from the last window
+    Weights are applied with a dot product, i.e. window @ kernel.T.
+    '''
+    check_window(window_length, polyorder)
+    half = window_length // 2
+
+    def coeffs(pos):
+        return np.stack((savgol_coeffs(window_length, polyorder, deriv=0, delta=delta, pos=pos, use='dot'),
+                         savgol_coeffs(window_length, polyorder, deriv=1, delta=delta, pos=pos, use='dot')))
+
+    kernel = coeffs(half)
+    left = np.stack([coeffs(pos) for pos in range(half)]) if half else np.empty((0, 2, window_length))
+    right = np.stack([coeffs(pos) for pos in range(half + 1, window_length)]) if half else np.empty((0, 2, window_length))
+
+    for arr in (kernel, left, right):
+        arr.setflags(write=False)
+
+    return kernel, left, right
+
+
+def apply_kernel(ys, kernel):
+    # Value and derivative of every full window of ys, shape (len(ys) - window_length + 1, 2).
+    return oaconvolve(ys[None, :], kernel[:, ::-1], mode='valid', axes=1).T
+
+
+def savgol_uniform(ys, window_length=51, polyorder=3, delta=1.0):
+    '''
+    Smoothed ys and its derivative (w.r.t. x, for an evenly spaced grid
+    with spacing delta), same as savgol_filter(mode='interp') with deriv=0
+    and deriv=1. Returns (ys_savgol, dys_savgol).
+    '''
+    ys = np.asarray(ys, dtype=float)
+    kernel, left, right = savgol_kernels(window_length, polyorder, float(delta))
+    half = window_length // 2
+
+    out = np.empty((len(ys), 2))
+    out[half:len(ys) - half] = apply_kernel(ys, kernel)
+    out[:half] = left @ ys[:window_length]
+    out[len(ys) - half:] = right @ ys[len(ys) - window_length:]
+
+    return out[:, 0], out[:, 1]
+
+
+def savgol_nonuniform(xs, ys, window_length=51, polyorder=3, chunk_size=4096):
+    '''
+    Savitzky-Golay for a non-uniform grid: a least-squares polynomial fit
+    of the window_length points around every point (the nearest full
+    window at the edges, like mode='interp'), evaluated at that point.
+    All fits of a chunk are solved at once. Returns (ys_savgol, dys_savgol).
+    '''
+    check_window(window_length, polyorder)
+    xs = np.asarray(xs, dtype=float)
+    ys = np.asarray(ys, dtype=float)
+    n_points = len(ys)
+    half = window_length // 2
+    powers = np.arange(polyorder + 1)
+
+    ys_savgol = np.empty(n_points)
+    dys_savgol = np.empty(n_points)
+
+    for start in range(0, n_points, chunk_size):
+        centers = np.arange(start, min(start + chunk_size, n_points))
+        firsts = np.clip(centers - half, 0, n_points - window_length)
+        inds = firsts[:, None] + np.arange(window_length)
+
+        dxs = xs[inds] - xs[centers, None]
+        scales = np.abs(dxs).max(axis=1)        #Fit in x scaled to [-1, 1] to keep the normal equations well conditioned.
+        scales[scales == 0] = 1.0
+        vander = (dxs / scales[:, None])[:, :, None] ** powers
+
+        vander_t = vander.transpose(0, 2, 1)
+        coeffs = np.linalg.solve(vander_t @ vander, vander_t @ ys[inds][:, :, None])[:, :, 0]
+
+        ys_savgol[centers] = coeffs[:, 0]
+        dys_savgol[centers] = coeffs[:, 1] / scales if polyorder else 0.0
+
+    return ys_savgol, dys_savgol
+
+
+def is_uniform(xs, rtol=1e-6):
+    steps = np.diff(xs)
+    return len(steps) == 0 or np.allclose(steps, steps[0], rtol=rtol, atol=0)
+
+
+def smooth(xs, ys, window_length=51, polyorder=3):
+    '''
+    Smoothed ys and its derivative w.r.t. xs, with the window shrunk for
+    short traces. Uses the cached kernels for evenly spaced xs and the
+    local fits otherwise. Returns (ys_savgol, dys_savgol).
+    '''
+    xs = np.asarray(xs, dtype=float)
+    window_length = fit_window(len(ys), window_length, polyorder)
+
+    if is_uniform(xs):
+        delta = (xs[-1] - xs[0]) / (len(xs) - 1) if len(xs) > 1 else 1.0
+        return savgol_uniform(ys, window_length, polyorder, delta)
+
+    return savgol_nonuniform(xs, ys, window_length, polyorder)
+
+
+class StreamingSavgol():
+    '''
+    savgol_uniform() on a trace that comes in chunks, with the same
+    result as on the whole trace. push() returns (xs, ys_savgol,
+    dys_savgol) for every point whose window is complete, finish()
+    returns the rest (the right edge.) Only window_length points are kept
+    between chunks.
+
+        stream = StreamingSavgol(51, 3, delta=1e6)
+        for xs, ys in chunks:
+            done = stream.push(xs, ys)
+            ...
+        done = stream.finish()
+    '''
+
+    def __init__(self, window_length=51, polyorder=3, delta=None):
+        check_window(window_length, polyorder)
+        self.window_length = window_length
+        self.polyorder = polyorder
+        self.delta = delta          #Grid spacing, taken from the first two points if None.
+        self.buf_xs = np.empty(0)   #Points from the first unfinished window on.
+        self.buf_ys = np.empty(0)
+        self.tail_xs = np.empty(0)  #The last window_length points, for the right edge.
+        self.tail_ys = np.empty(0)
+        self.started = False        #Whether the left edge is done.
+
+    def get_kernels(self):
+        return savgol_kernels(self.window_length, self.polyorder, float(self.delta))
+
+    def push(self, xs, ys):
+        xs = np.asarray(xs, dtype=float)
+        ys = np.asarray(ys, dtype=float)
+        self.buf_xs = np.concatenate((self.buf_xs, xs))
+        self.buf_ys = np.concatenate((self.buf_ys, ys))
+        self.tail_xs = np.concatenate((self.tail_xs, xs))[-self.window_length:]
+        self.tail_ys = np.concatenate((self.tail_ys, ys))[-self.window_length:]
+
+        if self.delta is None and len(self.buf_xs) > 1:
+            self.delta = self.buf_xs[1] - self.buf_xs[0]
+
+        if len(self.buf_ys) < self.window_length:
+            return (np.empty(0), np.empty(0), np.empty(0))
+
+        kernel, left, right = self.get_kernels()
+        half = self.window_length // 2
+        done = []
+
+        if not(self.started):
+            edge = left @ self.buf_ys[:self.window_length]
+            done.append((self.buf_xs[:half], edge[:, 0], edge[:, 1]))
+            self.started = True
+
+        n_windows = len(self.buf_ys) - self.window_length + 1
+        out = apply_kernel(self.buf_ys, kernel)
+        done.append((self.buf_xs[half:half + n_windows], out[:, 0], out[:, 1]))
+
+        self.buf_xs = self.buf_xs[n_windows:]
+        self.buf_ys = self.buf_ys[n_windows:]
+
+        return tuple(np.concatenate(arrs) for arrs in zip(*done))
+
+    def finish(self):
+        '''
+        Returns the last points. If the whole trace was shorter than
+        window_length, it's all returned here, with a shrunk window.
+        '''
+        if not(self.started):
+            if not(len(self.buf_ys)):
+                return (np.empty(0), np.empty(0), np.empty(0))
+
+            window_length = fit_window(len(self.buf_ys), self.window_length, self.polyorder)
+            return (self.buf_xs,) + savgol_uniform(self.buf_ys, window_length, self.polyorder, float(self.delta or 1.0))
+
+        kernel, left, right = self.get_kernels()
+        half = self.window_length // 2
+        edge = right @ self.tail_ys
+
+        self.buf_xs = self.buf_ys = np.empty(0)
+        return (self.tail_xs[self.window_length - half:], edge[:, 0], edge[:, 1])
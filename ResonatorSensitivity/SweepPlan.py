@@ -0,0 +1,180 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+import numpy as np
+
+'''
+----------------------
+N-DIMENSIONAL SWEEPS
+----------------------
+A proper version of the sweep cell in putting_it_together.ipynb: instead
+of zipping linspaces (so all the components change together), a plan
+covers the full grid (or a Latin hypercube) of component values, in an
+order where consecutive points change as little as possible, and every
+point is analyzed once with all the requested graphs read from that one
+analysis:
+
+    plan = SweepPlan.cartesian({'CAP': (1e-15, 1e-14), 'IND': (1e-8, 3e-8), 'RES': (1e9, 1e9)}, resolution=5)
+    results = plan.run(get_backend('analytic'), graph_names=('Parallel', 'Series'))
+    s11_grid = plan.to_grid(results['Parallel'])    #shape (5, 5, 1, n_freqs) (RES is constant, its axis has length 1)
+---------------------------------------
+'''
+
+
+def serpentine_indices(shape):
+    '''
+    Every multi-index of a grid of the given shape, in serpentine
+    (boustrophedon / reflected mixed-radix Gray code) order: the last axis
+    runs back and forth, and consecutive indices differ by one step along
+    exactly one axis. Returns an (n_points, n_axes) int array.
+    '''
+    shape = tuple(int(n) for n in shape)
+    ks = np.arange(int(np.prod(shape)))
+    inds = np.empty((len(ks), len(shape)), dtype=int)
+
+    stride = len(ks)
+    for axis, n in enumerate(shape):
+        outer = ks // stride       #Linear index over the axes before this one: odd means this axis runs backwards.
+        stride //= n
+        digits = (ks // stride) % n
+        inds[:, axis] = np.where(outer % 2, n - 1 - digits, digits)
+
+    return inds
+
+
+def nearest_neighbour_order(points):
+    # Greedy tour through the points (normalized coordinates), starting at the first one.
+    n_points = len(points)
+    order = np.empty(n_points, dtype=int)
+    left = np.ones(n_points, dtype=bool)
+    current = 0
+
+    for ind in range(n_points):
+        order[ind] = current
+        left[current] = False
+        if ind + 1 < n_points:
+            dists = np.abs(points - points[current]).sum(axis=1)
+            dists[~left] = np.inf
+            current = int(np.argmin(dists))
+
+    return order
+
+
+class SweepPlan():
+    '''
+    An ordered list of component values to simulate. keys are the
+    components (e.g. 'CAP', 'IND', 'RES'), points is an (n_points, n_keys)
+    array of their values, in the order they'll be run.
+    '''
+
+    def __init__(self, keys, points, shape=None, grid_indices=None):
+        self.keys = tuple(keys)
+        self.points = np.asarray(points, dtype=float).reshape(-1, len(self.keys))
+        self.shape = shape                  #Grid shape, for Cartesian plans.
+        self.grid_indices = grid_indices    #Grid multi-index of each point, for Cartesian plans.
+
+    def __len__(self):
+        return len(self.points)
+
+    @classmethod
+    def cartesian(cls, bounds, resolution=5):
+        '''
+        Full grid over bounds, a dictionary of 'COMPONENT': (lower_bound,
+        upper_bound) like sample_circ_param_bounds in the notebook.
+        resolution is the number of values per component, either one number
+        or a dictionary per component. Components with lower_bound ==
+        upper_bound are kept constant (a single value.)
+        '''
+        keys = tuple(bounds)
+        axes = []
+        for key in keys:
+            l_bnd, u_bnd = bounds[key]
+            n = resolution.get(key, 1) if isinstance(resolution, dict) else resolution
+            axes.append(np.linspace(l_bnd, u_bnd, 1 if l_bnd == u_bnd else n))
+
+        shape = tuple(len(axis) for axis in axes)
+        grid_indices = serpentine_indices(shape)
+        points = np.column_stack([axis[grid_indices[:, ind]] for ind, axis in enumerate(axes)])
+
+        return cls(keys, points, shape, grid_indices)
+
+    @classmethod
+    def latin_hypercube(cls, bounds, n_points, seed=None):
+        '''
+        n_points Latin hypercube samples over bounds (see cartesian()),
+        visited in a greedy nearest-neighbour order so consecutive points
+        are close together.
+        '''
+        keys = tuple(bounds)
+        rng = np.random.default_rng(seed)
+
+        # One sample per stratum along every axis, strata shuffled independently.
+        unit = (rng.permuted(np.tile(np.arange(n_points), (len(keys), 1)), axis=1).T
+                + rng.random((n_points, len(keys)))) / n_points
+        unit = unit[nearest_neighbour_order(unit)]
+
+        l_bnds = np.array([bounds[key][0] for key in keys], dtype=float)
+        u_bnds = np.array([bounds[key][1] for key in keys], dtype=float)
+
+        return cls(keys, l_bnds + unit*(u_bnds - l_bnds))
+
+    def iter_changes(self):
+        '''
+        Yields, for every point in order, a dictionary of only the
+        components that differ from the previous point (all of them for the
+        first one.)
+        '''
+        prev = None
+        for point in self.points:
+            if prev is None:
+                yield {key: float(value) for key, value in zip(self.keys, point)}
+            else:
+                yield {key: float(value) for key, value, prev_value in zip(self.keys, point, prev) if value != prev_value}
+            prev = point
+
+    def n_changes(self):
+        # Total number of component writes the plan takes.
+        return sum(len(changes) for changes in self.iter_changes())
+
+    def run(self, backend, schematic='Inductor_Subcircuit', graph_names=('Parallel', 'Series'), reduce=None):
+        '''
+        Runs the plan on a Backends.SimulatorBackend: sets the changed
+        components, analyzes once and fetches every graph in graph_names.
+
+        Returns a dictionary of graph name -> results in plan order: the
+        stacked traces (n_points, n_freqs) by default, or a list of
+        reduce(freqs, values) per point (e.g. S11Analysis.find_steepest),
+        plus 'freqs': graph name -> the frequencies of the last point.
+        '''
+        results = {name: [] for name in graph_names}
+        freqs = {}
+
+        for changes in self.iter_changes():
+            backend.set_element_values(schematic, **changes)
+            backend.analyze()
+
+            for name in graph_names:
+                xs, ys = backend.fetch_trace(name)
+                results[name].append(np.array(ys) if reduce is None else reduce(xs, ys))
+                freqs[name] = xs
+
+        if reduce is None:
+            results = {name: np.stack(traces) if traces else np.empty((0, 0)) for name, traces in results.items()}
+
+        results['freqs'] = freqs
+        return results
+
+    def to_grid(self, values):
+        '''
+        Reorders per-point values (in plan order, e.g. results['Parallel'])
+        into grid order, with shape self.shape + the values' own shape.
+        Cartesian plans only.
+        '''
+        if self.shape is None:
+            raise ValueError("Only Cartesian plans have a grid.")
+
+        values = np.asarray(values)
+        grid = np.empty(self.shape + values.shape[1:], dtype=values.dtype)
+        grid[tuple(self.grid_indices.T)] = values
+
+        return grid
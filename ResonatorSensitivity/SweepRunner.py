@@ -0,0 +1,177 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+import os
+import time
+import hashlib
+import itertools
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from ResSensitivity import *
+
+'''
+-------------------
+DESIGN-SPACE SWEEPS
+-------------------
+Runs the resonator sensitivity analysis over lots of circuit configurations
+in a process pool and collects the results in a columnar table (a dictionary
+of NumPy arrays, one entry per configuration, in the order they were given.)
+
+    specs = spec_grid(Ls=np.linspace(1e-9, 100e-9, 1000), Cs=np.linspace(1e-15, 100e-15, 1000))
+    table = run_sweep(specs, checkpoint_dir='sweep_checkpoints')
+
+If the run is interrupted, running it again with the same specs and
+checkpoint_dir picks up where it left off. Every checkpoint carries a
+fingerprint of its specs, chunk_size and tol, so ones from a different
+sweep in the same checkpoint_dir are recomputed rather than reused.
+---------------------------------------
+'''
+
+COLUMNS = ('is_series', 'L', 'C', 'z_in', 'w_l_bnd', 'w_u_bnd', 'res_freq', 'steep_freq', 'max_slope')
+DTYPES = (bool, float, float, complex, float, float, float, float, float)
+
+
+def spec_grid(series=(True, False), Ls=(20e-9,), Cs=(24.925e-15,), z_ins=(50,), bands=((4e9, 8e9),), stp_size=1000):
+    '''
+    Generates a CircuitSpec for every combination of series/parallel, L, C, z_in and (lower, upper) frequency band.
+    It's a generator, so even huge grids don't take up any memory.
+    '''
+    for ser, L, C, z_in, (w_l_bnd, w_u_bnd) in itertools.product(series, Ls, Cs, z_ins, bands):
+        yield CircuitSpec(ser, L, C, stp_size, z_in, w_l_bnd, w_u_bnd)
+
+
+def analyze_spec(spec, tol=1.0):
+    '''
+    Returns the row of the result table for one CircuitSpec: the spec itself, the resonant frequency and the
+    steepest point of S11 (frequency and slope) from Circuit.find_steep_analytic().
+    '''
+    circ = Circuit.from_spec(spec)
+    steep_dict = circ.find_steep_analytic(tol)
+
+    return (spec.is_series, spec.L, spec.C, spec.z_in, spec.w_l_bnd, spec.w_u_bnd,
+            circ.get_res_freq(), steep_dict["frequency"], steep_dict["derivative"])
+
+
+def analyze_chunk(specs, tol=1.0):
+    '''
+    Analyzes a list of CircuitSpecs and returns the results as a dictionary of column arrays.
+    '''
+    rows = [analyze_spec(spec, tol) for spec in specs]
+
+    return {col: np.array([row[i] for row in rows], dtype=dtype) for i, (col, dtype) in enumerate(zip(COLUMNS, DTYPES))}
+
+
+def checkpoint_path(checkpoint_dir, chunk_ind):
+    return os.path.join(checkpoint_dir, 'chunk_{:06d}.npz'.format(chunk_ind))
+
+
+def chunk_fingerprint(chunk, chunk_size, tol):
+    # Hash of everything that goes into a chunk's results, so a checkpoint is only reused for the exact same chunk.
+    key = repr((chunk_size, tol, [spec.as_tuple() for spec in chunk]))
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+def save_checkpoint(checkpoint_dir, chunk_ind, table, fingerprint):
+    # Written under a temporary name and then renamed, so a half-written file never looks like a finished chunk.
+    path = checkpoint_path(checkpoint_dir, chunk_ind)
+    tmp_path = path + '.tmp'
+
+    with open(tmp_path, 'wb') as f:
+        np.savez(f, fingerprint=np.array(fingerprint), **table)
+    os.replace(tmp_path, path)
+
+
+def load_checkpoint(checkpoint_dir, chunk_ind, fingerprint, n_rows):
+    '''
+    Returns the saved table of chunk chunk_ind, or None if there isn't one or it isn't for this chunk (different
+    fingerprint, e.g. from another sweep or chunk_size, or not n_rows rows.)
+    '''
+    path = checkpoint_path(checkpoint_dir, chunk_ind)
+    if not(os.path.exists(path)):
+        return None
+
+    try:
+        with np.load(path) as npz:
+            if 'fingerprint' not in npz.files or str(npz['fingerprint']) != fingerprint:
+                return None
+
+            table = {col: npz[col] for col in COLUMNS}
+    except (OSError, KeyError, ValueError): #Unreadable, just recompute it.
+        return None
+
+    if any(len(arr) != n_rows for arr in table.values()):
+        return None
+
+    return table
+
+
+def print_progress(n_done, n_total, elapsed):
+    if n_total:
+        print('{}/{} configurations ({:.1f}%) in {:.1f} s'.format(n_done, n_total, 100.0*n_done/n_total, elapsed))
+    else:
+        print('{} configurations in {:.1f} s'.format(n_done, elapsed))
+
+
+def run_sweep(specs, chunk_size=10000, max_workers=None, checkpoint_dir=None, progress=print_progress, tol=1.0):
+    '''
+    Analyzes every CircuitSpec in specs across a ProcessPoolExecutor, chunk_size specs per task, and returns a
+    columnar result table (dictionary of arrays, see COLUMNS) in the same order as specs.
+
+    specs can be any iterable, including a spec_grid() generator. Only a couple of chunks per worker are in flight
+    at any time. After each finished chunk progress(n_done, n_total, elapsed) is called (n_total is None if specs
+    has no len()); pass progress=None to keep quiet. With a checkpoint_dir every finished chunk is saved there,
+    and chunks that are already there (with a matching fingerprint) are loaded instead of being recomputed, so an
+    interrupted sweep can be resumed by running it again with the same specs.
+    '''
+    n_total = len(specs) if hasattr(specs, '__len__') else None
+    specs = iter(specs)
+    max_workers = max_workers or os.cpu_count()
+    tables = {}
+    n_done = 0
+    t0 = time.time()
+
+    if checkpoint_dir:
+        os.makedirs(checkpoint_dir, exist_ok=True)
+
+    fingerprints = {}
+
+    def finish(chunk_ind, table, save=False):
+        nonlocal n_done
+        if save and checkpoint_dir:
+            save_checkpoint(checkpoint_dir, chunk_ind, table, fingerprints.pop(chunk_ind))
+
+        tables[chunk_ind] = table
+        n_done += len(table['L'])
+        if progress:
+            progress(n_done, n_total, time.time() - t0)
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        pending = {}
+
+        for chunk_ind in itertools.count():
+            chunk = list(itertools.islice(specs, chunk_size))
+            if not(chunk):
+                break
+
+            if checkpoint_dir:
+                fingerprints[chunk_ind] = chunk_fingerprint(chunk, chunk_size, tol)
+                table = load_checkpoint(checkpoint_dir, chunk_ind, fingerprints[chunk_ind], len(chunk))
+                if table is not None:
+                    del fingerprints[chunk_ind]
+                    finish(chunk_ind, table)
+                    continue
+
+            pending[executor.submit(analyze_chunk, chunk, tol)] = chunk_ind
+
+            while len(pending) >= 2*max_workers:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    finish(pending.pop(future), future.result(), save=True)
+
+        for future, done_ind in pending.items():
+            finish(done_ind, future.result(), save=True)
+
+    if not(tables):
+        return {col: np.array([], dtype=dtype) for col, dtype in zip(COLUMNS, DTYPES)}
+
+    return {col: np.concatenate([tables[ind][col] for ind in sorted(tables)]) for col in COLUMNS}
@@ -0,0 +1,181 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+import os
+import re
+import glob
+import json
+import numpy as np
+
+'''
+-----------------
+AWR TRACE EXPORTS
+-----------------
+Reads the tab separated trace exports MWO writes (like temp.txt), e.g.
+
+    Frequency (MHz)	|S(1,1)| : SeriesCircuit_Capacitive.$FPRJ
+    5000	1
+    5001	1
+    ...
+
+Each y column after the x column is a trace. A file can also hold several
+blocks, each starting with its own header line. Parsed files are cached as
+.npz sidecar files in a __tracecache__ folder next to them, keyed by the
+file's modification time and size, so opening them again is nearly free.
+---------------------------------------
+'''
+
+CACHE_DIR = '__tracecache__'
+CACHE_VERSION = 1
+
+UNIT_SCALES = {'Hz': 1.0, 'kHz': 1e3, 'MHz': 1e6, 'GHz': 1e9, 'THz': 1e12}
+
+X_HEADER = re.compile(r'^(?P<name>.*?)\s*\((?P<unit>[^()]*)\)\s*$')                                     # Frequency (MHz)
+Y_HEADER = re.compile(r'^(?P<measurement>.*?)\s*:\s*(?P<schematic>.*?)(?:\.(?P<document>\$\w+))?\s*$')  # |S(1,1)| : SeriesCircuit_Capacitive.$FPRJ
+
+
+class Trace():
+    '''
+    One exported trace: the x (usually frequency) and y values plus what
+    the header says about them.
+    '''
+
+    def __init__(self, xs, ys, x_name, x_unit, measurement, schematic, document, header):
+        self.xs = xs                        #x values, in x_unit
+        self.ys = ys                        #y values
+        self.x_name = x_name                #e.g. 'Frequency'
+        self.x_unit = x_unit                #e.g. 'MHz'
+        self.measurement = measurement      #e.g. '|S(1,1)|'
+        self.schematic = schematic          #e.g. 'SeriesCircuit_Capacitive'
+        self.document = document            #e.g. '$FPRJ'
+        self.header = header                #The y column header as it was in the file.
+
+    def __repr__(self):
+        return 'Trace({} : {}, {} points)'.format(self.measurement, self.schematic, len(self.xs))
+
+    def get_freqs_hz(self):
+        # x values converted to Hz (if x_unit is a frequency unit we know.)
+        return self.xs * UNIT_SCALES.get(self.x_unit, 1.0)
+
+    def get_meta(self):
+        return {'x_name': self.x_name, 'x_unit': self.x_unit, 'measurement': self.measurement,
+                'schematic': self.schematic, 'document': self.document, 'header': self.header}
+
+
+def parse_header(line):
+    '''
+    Splits a header line into the x column's name and unit and a list of
+    (measurement, schematic, document, raw header) for the y columns.
+    '''
+    cols = line.rstrip('\r\n').split('\t')
+    x_match = X_HEADER.match(cols[0].strip())
+    x_name, x_unit = (x_match.group('name'), x_match.group('unit')) if x_match else (cols[0].strip(), '')
+
+    ys = []
+    for col in cols[1:]:
+        y_match = Y_HEADER.match(col.strip())
+        if y_match:
+            ys.append((y_match.group('measurement'), y_match.group('schematic'), y_match.group('document') or '', col))
+        else:
+            ys.append((col.strip(), '', '', col))
+
+    return x_name, x_unit, ys
+
+
+def is_header(line):
+    # Blank (or whitespace only) lines are neither headers nor data.
+    line = line.strip()
+    return bool(line) and not(line[0].isdigit() or line[0] in '+-.')
+
+
+def parse_traces(text):
+    '''
+    Parses the contents of an export into a list of Traces. Every block
+    of numbers is converted in a single NumPy call, not line by line.
+    '''
+    lines = text.splitlines()
+    header_inds = [ind for ind, line in enumerate(lines) if is_header(line)]
+    traces = []
+
+    for block_ind, start in enumerate(header_inds):
+        stop = header_inds[block_ind + 1] if block_ind + 1 < len(header_inds) else len(lines)
+        x_name, x_unit, ys = parse_header(lines[start])
+        n_cols = len(ys) + 1
+
+        values = np.array(' '.join(lines[start + 1:stop]).split(), dtype=float)
+        values = values.reshape(-1, n_cols)
+
+        for col, (measurement, schematic, document, header) in enumerate(ys, start=1):
+            traces.append(Trace(values[:, 0], values[:, col], x_name, x_unit, measurement, schematic, document, header))
+
+    return traces
+
+
+def cache_path(path):
+    folder, name = os.path.split(os.path.abspath(path))
+    return os.path.join(folder, CACHE_DIR, name + '.npz')
+
+
+def load_cached(path, stat):
+    sidecar = cache_path(path)
+    if not(os.path.exists(sidecar)):
+        return None
+
+    try:
+        with np.load(sidecar) as npz:
+            key = npz['key']
+            if int(key[0]) != CACHE_VERSION or int(key[1]) != stat.st_mtime_ns or int(key[2]) != stat.st_size:
+                return None
+
+            metas = json.loads(str(npz['meta']))
+            return [Trace(npz['xs_{}'.format(ind)], npz['ys_{}'.format(ind)], **meta) for ind, meta in enumerate(metas)]
+    except (OSError, KeyError, ValueError): #Unreadable or from an older version, just parse the file again.
+        return None
+
+
+def save_cached(path, stat, traces):
+    sidecar = cache_path(path)
+    os.makedirs(os.path.dirname(sidecar), exist_ok=True)
+
+    arrays = {'key': np.array([CACHE_VERSION, stat.st_mtime_ns, stat.st_size], dtype=np.int64),
+              'meta': np.array(json.dumps([trace.get_meta() for trace in traces]))}
+    for ind, trace in enumerate(traces):
+        arrays['xs_{}'.format(ind)] = trace.xs
+        arrays['ys_{}'.format(ind)] = trace.ys
+
+    tmp_path = sidecar + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        np.savez(f, **arrays)
+    os.replace(tmp_path, sidecar)
+
+
+def load_traces(path, cache=True):
+    '''
+    Returns the list of Traces in the export at path, from the sidecar
+    cache if the file hasn't changed since it was last parsed.
+    '''
+    stat = os.stat(path)
+
+    if cache:
+        traces = load_cached(path, stat)
+        if traces is not None:
+            return traces
+
+    with open(path, newline='') as f:
+        traces = parse_traces(f.read())
+
+    if cache:
+        try:
+            save_cached(path, stat, traces)
+        except OSError: #E.g. a read-only shared export folder, just don't cache.
+            pass
+
+    return traces
+
+
+def load_folder(folder, pattern='*.txt', cache=True):
+    '''
+    Loads every export matching pattern in folder. Returns a dictionary
+    of path -> list of Traces, sorted by path.
+    '''
+    return {path: load_traces(path, cache) for path in sorted(glob.glob(os.path.join(folder, pattern)))}
@@ -0,0 +1,87 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+from time import perf_counter
+
+import numpy as np
+
+
+class BufferedResultWriter():
+    '''
+    Point-by-point results writer for a QCoDeS DataSaver (what
+    Measurement.run() gives you.)
+
+    Calling datasaver.add_result() once per point means a separate
+    SQLite insert per point, which is way slower than our simulated
+    instruments. This class collects the points in preallocated NumPy
+    buffers instead and hands them to the DataSaver as whole arrays (one
+    add_result() and one flush, i.e. one transaction, per batch.) A batch
+    is written once buffer_size points have piled up, once flush_interval
+    seconds have passed since the last write, and when the writer is
+    closed.
+
+    Works for any scalar numeric or complex parameters registered with the
+    Measurement, e.g. the SQUID's ext_flux/total_current or an RLC
+    circuit's supply_freq/ref_coeff:
+
+        with meas.run() as datasaver, BufferedResultWriter(datasaver, (sid.ext_flux, sid.total_current)) as writer:
+            for phi in fluxes:
+                sid.ext_flux(phi)
+                writer.add_result((sid.ext_flux, phi), (sid.total_current, sid.total_current()))
+    '''
+
+    def __init__(self, datasaver, params, buffer_size=10000, flush_interval=5.0):
+        self.datasaver = datasaver
+        self.params = tuple(params)
+        self.buffer_size = int(buffer_size)
+        self.flush_interval = flush_interval
+        self.buffers = None             #One array per parameter, allocated with the first point (so we know the dtypes.)
+        self.n_buffered = 0
+        self.n_written = 0
+        self._names = {param.full_name: ind for ind, param in enumerate(self.params)}
+        self._last_flush = perf_counter()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def add_result(self, *res_tuple):
+        '''
+        Same call as DataSaver.add_result() for a single point: (parameter,
+        value) pairs, one for every parameter the writer was made with.
+        '''
+        if len(res_tuple) != len(self.params):
+            raise ValueError("Expected a value for each of {}, got {}.".format(
+                [param.full_name for param in self.params], [param.full_name for param, _ in res_tuple]))
+
+        if self.buffers is None:
+            self.buffers = [None] * len(self.params)
+            for param, value in res_tuple:
+                dtype = np.complex128 if np.iscomplexobj(value) else np.float64
+                self.buffers[self._names[param.full_name]] = np.empty(self.buffer_size, dtype=dtype)
+
+        for param, value in res_tuple:
+            self.buffers[self._names[param.full_name]][self.n_buffered] = value
+
+        self.n_buffered += 1
+
+        if self.n_buffered >= self.buffer_size or perf_counter() - self._last_flush > self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        '''
+        Writes everything buffered so far to the database in one go.
+        '''
+        if self.n_buffered:
+            # Copies, since the DataSaver may hold on to what it's given and the buffers get reused.
+            self.datasaver.add_result(*((param, buf[:self.n_buffered].copy()) for param, buf in zip(self.params, self.buffers)))
+            self.datasaver.flush_data_to_database()
+            self.n_written += self.n_buffered
+            self.n_buffered = 0
+
+        self._last_flush = perf_counter()
+
+    def close(self):
+        self.flush()
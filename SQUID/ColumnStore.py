@@ -0,0 +1,175 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import shutil
+import sqlite3
+import pathlib
+
+import numpy as np
+
+from qcodes.dataset.data_set import load_by_id
+from qcodes.dataset.sqlite.database import connect
+
+'''
+-------------
+COLUMN STORE
+-------------
+Exports runs from a QCoDeS database (e.g. squid_test.db or LC_test.db)
+to plain .npy column files, one per parameter, laid out as
+
+    out_dir/run_00001/meta.json
+    out_dir/run_00001/<dependent parameter>/<parameter>.npy
+
+and reads them back memory-mapped, so slicing a column of a stored run
+doesn't involve SQLite (or even reading the whole file) at all:
+
+    export_runs('squid_test.db', 'squid_columns')
+    store = ColumnStore('squid_columns')
+    currents = store.load(3, 'sid_total_current_axis')[::10]
+---------------------------------------
+'''
+
+
+def list_run_ids(db_path, conn=None):
+    '''
+    Plain SQLite query, no need to load any datasets for this. Uses conn
+    if given (e.g. the one export_runs() has open), otherwise opens the
+    database read-only.
+    '''
+    if conn is not None:
+        return [row[0] for row in conn.execute('SELECT run_id FROM runs ORDER BY run_id')]
+
+    uri = pathlib.Path(db_path).resolve().as_uri() + '?mode=ro' #as_uri() escapes '?', '#' and '%' in the path.
+    ro_conn = sqlite3.connect(uri, uri=True)
+    try:
+        return [row[0] for row in ro_conn.execute('SELECT run_id FROM runs ORDER BY run_id')]
+    finally:
+        ro_conn.close()
+
+
+def run_dir_name(run_id):
+    return 'run_{:05d}'.format(run_id)
+
+
+def export_run(dataset, run_dir):
+    '''
+    Writes every parameter of a QCoDeS dataset to .npy files in run_dir,
+    plus a meta.json with the run's identity and the parameters' units,
+    labels, dtypes, shapes and dependencies.
+    '''
+    tmp_dir = run_dir + '.tmp' #Written aside and renamed at the end, so a half-exported run is never picked up.
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    meta = {'run_id': dataset.run_id,
+            'guid': dataset.guid,
+            'name': dataset.name,
+            'exp_name': dataset.exp_name,
+            'sample_name': dataset.sample_name,
+            'dependents': {}}
+
+    for dependent, columns in dataset.get_parameter_data().items():
+        os.makedirs(os.path.join(tmp_dir, dependent))
+        meta['dependents'][dependent] = {}
+
+        for param, data in columns.items():
+            if data.dtype == object: #Text columns, stored as fixed width strings so they can still be memory-mapped.
+                data = data.astype(str)
+            np.save(os.path.join(tmp_dir, dependent, param + '.npy'), data)
+
+            spec = dataset.paramspecs[param]
+            meta['dependents'][dependent][param] = {'unit': spec.unit,
+                                                    'label': spec.label,
+                                                    'depends_on': list(spec.depends_on_),
+                                                    'dtype': str(data.dtype),
+                                                    'shape': list(data.shape)}
+
+    with open(os.path.join(tmp_dir, 'meta.json'), 'w') as f:
+        json.dump(meta, f, indent=2)
+
+    shutil.rmtree(run_dir, ignore_errors=True)
+    os.replace(tmp_dir, run_dir)
+
+    return meta
+
+
+def export_runs(db_path, out_dir, run_ids=None, overwrite=False):
+    '''
+    Exports the runs run_ids (all of them by default) of the database at
+    db_path into out_dir. Runs that were already exported (same GUID) are
+    skipped unless overwrite is True, so this can just be rerun whenever
+    new runs have been added. Returns the list of exported run IDs.
+    '''
+    os.makedirs(out_dir, exist_ok=True)
+    conn = connect(db_path)
+    exported = []
+
+    try:
+        if run_ids is None:
+            run_ids = list_run_ids(db_path, conn)
+
+        for run_id in run_ids:
+            dataset = load_by_id(run_id, conn=conn)
+            run_dir = os.path.join(out_dir, run_dir_name(run_id))
+            meta_path = os.path.join(run_dir, 'meta.json')
+
+            if not(overwrite) and os.path.exists(meta_path):
+                with open(meta_path) as f:
+                    if json.load(f)['guid'] == dataset.guid:
+                        continue
+
+            export_run(dataset, run_dir)
+            exported.append(run_id)
+    finally:
+        conn.close()
+
+    return exported
+
+
+class ColumnStore():
+    '''
+    Reader for a directory written by export_runs(). Columns are returned
+    as read-only memory-mapped arrays, so only the parts that are actually
+    sliced are ever read from disk.
+    '''
+
+    def __init__(self, out_dir):
+        self.out_dir = out_dir
+        self._metas = {}
+
+    def run_ids(self):
+        return sorted(int(name[4:]) for name in os.listdir(self.out_dir)
+                      if name.startswith('run_') and not(name.endswith('.tmp')))
+
+    def meta(self, run_id):
+        if run_id not in self._metas:
+            with open(os.path.join(self.out_dir, run_dir_name(run_id), 'meta.json')) as f:
+                self._metas[run_id] = json.load(f)
+
+        return self._metas[run_id]
+
+    def params(self, run_id):
+        # Dictionary of dependent parameter -> list of its columns (itself and its setpoints.)
+        return {dependent: list(columns) for dependent, columns in self.meta(run_id)['dependents'].items()}
+
+    def load(self, run_id, param, dependent=None):
+        '''
+        Returns the column param of run run_id, memory-mapped. dependent
+        picks which dependent parameter's data to take it from; by default
+        that's param itself if it's a dependent, otherwise the first
+        dependent that has it (setpoints are stored with every dependent.)
+        '''
+        dependents = self.meta(run_id)['dependents']
+
+        if dependent is None:
+            if param in dependents:
+                dependent = param
+            else:
+                dependent = next((dep for dep, columns in dependents.items() if param in columns), None)
+
+        if dependent not in dependents or param not in dependents[dependent]:
+            raise KeyError("Run {} has no column {} (dependent: {}).".format(run_id, param, dependent))
+
+        return np.load(os.path.join(self.out_dir, run_dir_name(run_id), dependent, param + '.npy'), mmap_mode='r')
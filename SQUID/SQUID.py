@@ -10,13 +10,24 @@ from scipy.constants import e, hbar
 
 import qcodes as qc
 from qcodes import (Instrument)
-from qcodes.utils.validators import Numbers, Arrays
+from qcodes.utils.validators import Numbers, Ints, Arrays
 from qcodes.instrument.parameter import ParameterWithSetpoints, Parameter
 from qcodes.dataset.measurements import Measurement
 from qcodes.dataset.plotting import plot_dataset
 from qcodes.dataset.sqlite.database import initialise_or_create_database_at
 from qcodes.dataset.experiment_container import load_or_create_experiment
 
+from BufferedSaver import BufferedResultWriter
+
+
+
+def calc_total_current(crit_current, ext_flux, phase=np.pi/2.0):
+    '''
+    Total current through the SQUID, 2 * I_c * sin(phase) * cos(e/hbar * Phi).
+    ext_flux can be a single flux or a whole array of them, in which case
+    the currents for all of them are calculated in one go.
+    '''
+    return 2.0 * crit_current * np.sin(phase) * np.cos(e / hbar * ext_flux)
 
 
 class TotalCurrent(Parameter):
@@ -40,9 +51,8 @@ class TotalCurrent(Parameter):
         print(self.root_instrument.ext_flux())
 
     def get_raw(self):
-        #TODO: figure out this phase thing.
-        phase = np.pi/2.0
-        return 2.0 * self.root_instrument.critical_current.get_latest() * np.sin(phase) * np.cos(e / hbar * self.root_instrument.ext_flux.get_latest())
+        phase = self.root_instrument.phase.get_latest()
+        return calc_total_current(self.root_instrument.critical_current.get_latest(), self.root_instrument.ext_flux.get_latest(), phase)
 
 class FluxAxis(Parameter):
     """
@@ -57,21 +67,59 @@ class FluxAxis(Parameter):
 
     def get_raw(self):
         return np.linspace(self._startparam(), self._stopparam(),
-                              self._numpointsparam())
+                              int(self._numpointsparam()))
+
+    def iter_chunks(self, chunk_size=int(1e5)):
+        '''
+        Yields the same points as get_raw(), chunk_size at a time, so the
+        whole axis never has to be in memory at once.
+        '''
+        start = self._startparam()
+        stop = self._stopparam()
+        npoints = int(self._numpointsparam())
+        step = (stop - start) / (npoints - 1) if npoints > 1 else 0.0
+
+        for first in range(0, npoints, chunk_size):
+            chunk = start + step * np.arange(first, min(first + chunk_size, npoints))
+            if first + chunk_size >= npoints and npoints > 1:
+                chunk[-1] = stop #Same as linspace, the last point is exactly stop.
+            yield chunk
 
 class TotalCurrentAxis(ParameterWithSetpoints):
+    '''
+    Total current for every flux in ext_flux_axis (its setpoints),
+    calculated in a single vectorized evaluation rather than point by point.
+    '''
 
     def __init__(self, name, instrument, **kwargs):
         super().__init__(name=name, instrument=instrument, **kwargs)
 
     def get_raw(self):
-        npoints = self.root_instrument.n_points.get_latest()
-        axis = np.zeroes(npoints)
+        phase = self.root_instrument.phase.get_latest()
+        fluxes = self.root_instrument.ext_flux_axis()
+        return calc_total_current(self.root_instrument.critical_current.get_latest(), fluxes, phase)
+
+
+class TotalCurrentMap(ParameterWithSetpoints):
+    '''
+    Total current over a 2D grid: ext_flux_axis along the first dimension
+    and either phase_axis (axis='phase') or crit_current_axis
+    (axis='critical_current') along the second. The whole grid is
+    calculated in one go by broadcasting the two axes against each other.
+    '''
+
+    def __init__(self, name, instrument, axis='phase', **kwargs):
+        super().__init__(name=name, instrument=instrument, **kwargs)
+        self._axis = axis
+
+    def get_raw(self):
+        squid = self.root_instrument
+        fluxes = squid.ext_flux_axis()[:, np.newaxis]
 
-        for i in range(len(axis)) :
-            axis[i] = self.root_instrument.total_current()
+        if self._axis == 'phase':
+            return calc_total_current(squid.critical_current.get_latest(), fluxes, squid.phase_axis()[np.newaxis, :])
 
-        return axis
+        return calc_total_current(squid.crit_current_axis()[np.newaxis, :], fluxes, squid.phase.get_latest())
 
 
 class SQUID(Instrument):
@@ -103,7 +151,16 @@ class SQUID(Instrument):
                            get_cmd=None,
                            set_cmd=None
                            )
-        self.calibrate() #Must be done immediately after adding the external flux parameter.
+        self.ext_flux(0) #Must be set immediately after adding the external flux parameter (calibrate() below needs the sweep parameters too.)
+
+        self.add_parameter('phase',
+                           initial_value=np.pi/2.0,
+                           unit='rad',
+                           label='Phase',
+                           get_parser=float,
+                           get_cmd=None,
+                           set_cmd=None
+                           )
 
 
         self.add_parameter('total_current',
@@ -118,23 +175,24 @@ class SQUID(Instrument):
                            initial_value=0,
                            unit='T',
                            label='flux start',
-                           vals=Numbers(0,1e3),
+                           vals=Numbers(),
                            get_cmd=None,
                            set_cmd=None)
 
         self.add_parameter('phi_stop',
                            unit='T',
                            label='flux stop',
-                           vals=Numbers(1,1e3),
+                           vals=Numbers(),
                            get_cmd=None,
                            set_cmd=None)
 
         self.add_parameter('n_points',
                            unit='',
                            initial_value=10,
-                           vals=Numbers(1,1e3),
+                           vals=Ints(min_value=1), #No upper limit: use iter_total_current()/run_flux_sweep() for huge sweeps.
                            get_cmd=None,
                            set_cmd=None)
+        self.calibrate() #Must be done once the flux and sweep parameters exist.
 
         self.add_parameter('ext_flux_axis',
                            unit='T',
@@ -150,9 +208,95 @@ class SQUID(Instrument):
                            unit='A',
                            label='Total Current',
                            parameter_class=TotalCurrentAxis,
+                           setpoints=(self.ext_flux_axis,),
                            vals=Arrays(shape=(self.n_points.get_latest,))
                            )
 
+        # Second axes for the 2D maps.
+        self.add_parameter('phase_start',
+                           initial_value=0,
+                           unit='rad',
+                           label='phase start',
+                           vals=Numbers(),
+                           get_cmd=None,
+                           set_cmd=None)
+
+        self.add_parameter('phase_stop',
+                           initial_value=np.pi,
+                           unit='rad',
+                           label='phase stop',
+                           vals=Numbers(),
+                           get_cmd=None,
+                           set_cmd=None)
+
+        self.add_parameter('n_phase_points',
+                           unit='',
+                           initial_value=10,
+                           vals=Ints(min_value=1),
+                           get_cmd=None,
+                           set_cmd=None)
+
+        self.add_parameter('phase_axis',
+                           unit='rad',
+                           label='Phase',
+                           parameter_class=FluxAxis,
+                           start=self.phase_start,
+                           stop=self.phase_stop,
+                           numpoints=self.n_phase_points,
+                           vals=Arrays(shape=(self.n_phase_points.get_latest,))
+                           )
+
+        self.add_parameter('ic_start',
+                           initial_value=0,
+                           unit='A',
+                           label='critical current start',
+                           vals=Numbers(),
+                           get_cmd=None,
+                           set_cmd=None)
+
+        self.add_parameter('ic_stop',
+                           initial_value=crit_current,
+                           unit='A',
+                           label='critical current stop',
+                           vals=Numbers(),
+                           get_cmd=None,
+                           set_cmd=None)
+
+        self.add_parameter('n_ic_points',
+                           unit='',
+                           initial_value=10,
+                           vals=Ints(min_value=1),
+                           get_cmd=None,
+                           set_cmd=None)
+
+        self.add_parameter('crit_current_axis',
+                           unit='A',
+                           label='Critical current',
+                           parameter_class=FluxAxis,
+                           start=self.ic_start,
+                           stop=self.ic_stop,
+                           numpoints=self.n_ic_points,
+                           vals=Arrays(shape=(self.n_ic_points.get_latest,))
+                           )
+
+        self.add_parameter('total_current_phase_map',
+                           unit='A',
+                           label='Total Current',
+                           parameter_class=TotalCurrentMap,
+                           axis='phase',
+                           setpoints=(self.ext_flux_axis, self.phase_axis),
+                           vals=Arrays(shape=(self.n_points.get_latest, self.n_phase_points.get_latest))
+                           )
+
+        self.add_parameter('total_current_ic_map',
+                           unit='A',
+                           label='Total Current',
+                           parameter_class=TotalCurrentMap,
+                           axis='critical_current',
+                           setpoints=(self.ext_flux_axis, self.crit_current_axis),
+                           vals=Arrays(shape=(self.n_points.get_latest, self.n_ic_points.get_latest))
+                           )
+
 
         if self.name is 'tempSQUID': #Only print connect message when actual SQUID connected, not when a temp one is instantiated.
             pass
@@ -165,11 +309,88 @@ class SQUID(Instrument):
     def get_idn(self): #Overwritten the get id function from the instrument superclass.
         return {'vendor' : 'KOUBIT', 'model' : 'squiddy', 'serial': self.name + '-217', 'firmware' : '0.0'}
 
-    def calibrate(self, phi=0, start=0, stop=10, npoints=1e3): #Sets current external flux to given value (0 by default)
+    def iter_total_current(self, chunk_size=int(1e5)):
+        '''
+        Yields (fluxes, total currents) for ext_flux_axis, chunk_size
+        points at a time. Peak memory depends on chunk_size, not n_points.
+        '''
+        phase = self.phase.get_latest()
+
+        for fluxes in self.ext_flux_axis.iter_chunks(chunk_size):
+            yield fluxes, calc_total_current(self.critical_current.get_latest(), fluxes, phase)
+
+    def calibrate(self, phi=0, start=0, stop=10, npoints=1000): #Sets current external flux to given value (0 by default)
         self.ext_flux(phi)
         self.phi_start(start)
         self.phi_stop(stop)
-        self.npoints(n_points)
+        self.n_points(npoints)
+
+
+def run_flux_sweep(squid, chunk_size=int(1e5)):
+    '''
+    Measures total current vs. external flux over the squid's flux axis
+    (phi_start, phi_stop, n_points) with any number of points. The sweep
+    is generated and written to the database chunk_size points at a time
+    (one add_result() and one flush per chunk) instead of as one giant
+    array, so 10^7 point sweeps don't need 10^7 point arrays.
+
+    Returns the dataset.
+    '''
+    meas = Measurement()
+    meas.register_parameter(squid.ext_flux)
+    meas.register_parameter(squid.total_current, setpoints=(squid.ext_flux,))
+
+    with meas.run() as datasaver:
+        for fluxes, currents in squid.iter_total_current(chunk_size):
+            datasaver.add_result((squid.ext_flux, fluxes), (squid.total_current, currents))
+            datasaver.flush_data_to_database()
+
+    return datasaver.dataset
+
+
+def run_point_sweep(squid, fluxes, buffer_size=10000, flush_interval=5.0):
+    '''
+    Measures total current point by point (set ext_flux, get
+    total_current) for every flux in fluxes. The points go through a
+    BufferedResultWriter, so they're written to the database in batches
+    of buffer_size rather than one insert per point.
+
+    Returns the dataset.
+    '''
+    meas = Measurement()
+    meas.register_parameter(squid.ext_flux)
+    meas.register_parameter(squid.total_current, setpoints=(squid.ext_flux,))
+
+    with meas.run() as datasaver:
+        with BufferedResultWriter(datasaver, (squid.ext_flux, squid.total_current), buffer_size, flush_interval) as writer:
+            for phi in fluxes:
+                squid.ext_flux(phi)
+                writer.add_result((squid.ext_flux, phi), (squid.total_current, squid.total_current()))
+
+    return datasaver.dataset
+
+
+def run_flux_map(squid, axis='phase'):
+    '''
+    Measures a 2D map of total current vs. external flux and either phase
+    (axis='phase') or critical current (axis='critical_current'). The
+    whole grid comes from a single get of the map parameter and is stored
+    with a single add_result().
+
+    Returns the dataset.
+    '''
+    if axis == 'phase':
+        current_map = squid.total_current_phase_map
+    else:
+        current_map = squid.total_current_ic_map
+
+    meas = Measurement()
+    meas.register_parameter(current_map)
+
+    with meas.run() as datasaver:
+        datasaver.add_result((current_map, current_map())) #The DataSaver gets and expands both setpoint axes itself.
+
+    return datasaver.dataset
 
 
 """
@@ -20,7 +20,7 @@ from qcodes import (
     load_or_create_experiment,
     new_experiment,
 )
-from qcodes.utils.validators import Numbers, Arrays
+from qcodes.utils.validators import Numbers, Ints, Arrays
 from qcodes.dataset.plotting import plot_dataset
 # from qcodes.dataset.measurements import Measurement
 from qcodes.logger.logger import start_all_logging
@@ -80,7 +80,7 @@ class DummySQUID(Instrument):
         self.add_parameter('n_points',
                            unit='',
                            initial_value=10,
-                           vals=Numbers(1,1e3),
+                           vals=Ints(min_value=1),
                            get_cmd=None,
                            set_cmd=None)
 